@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -106,6 +107,34 @@ else:
     }
 
 
+# Cache
+# Tiene que ser compartida entre los workers de gunicorn y el loop de sync:
+# las invalidaciones por señal corren en el proceso que escribe. Con REDIS_URL
+# se usa Redis, que es lo recomendado con varios workers; sin ella, caché en
+# disco (CACHE_DIR) en lugar de LocMemCache, que es por proceso y dejaba
+# paneles viejos en los otros workers. FileBasedCache borra un tercio de los
+# archivos al pasar MAX_ENTRIES (300 por defecto), y las búsquedas por tecla lo
+# llenan rápido: se sube el límite.
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR", os.path.join(tempfile.gettempdir(), "erp-cache")),
+            "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# product_search filtra con icontains sobre sku, name y group, que en Postgres
+# se traduce a UPPER(col::text) LIKE UPPER('%term%'). Los índices GIN de
+# trigramas sobre esa misma expresión evitan el seq scan. En SQLite no aplica.
+SEARCH_COLUMNS = ("sku", "name", "group")
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS product_{column}_trgm_idx '
+            f'ON inventory_product USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS product_{column}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0057_resync_product_cost_from_principal"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
@@ -87,6 +87,11 @@ def update_product_avg_costs(items: list[dict]) -> None:
         if data["total_qty"] > 0:
             avg = (data["total_cost"] / data["total_qty"]).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
             Product.objects.filter(pk=pid).update(avg_cost=avg)
+    if by_product:
+        # update() no dispara post_save: las búsquedas cacheadas guardan avg_cost.
+        from .views.common import _invalidate_product_caches
+
+        _invalidate_product_caches()
 
 
 @transaction.atomic
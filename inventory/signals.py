@@ -1,5 +1,5 @@
 from django.db.backends.signals import connection_created
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
 from .middleware import get_current_user
@@ -21,6 +21,51 @@ def _model_fields(instance):
     return data
 
 
+def _bulk_audit(sender, *, created=(), updated=()):
+    """Escribe los AuditLog que save() habría generado para altas y ediciones
+    hechas con bulk_create/bulk_update/update(), que no disparan las señales.
+
+    updated son pares (instancia, {campo: (antes, despues)}); los campos que no
+    cambiaron se omiten y una instancia sin cambios no genera entrada.
+    """
+    from .models import AuditLog
+
+    user = get_current_user()
+    model_name = sender.__name__
+    entries = [
+        AuditLog(
+            action=AuditLog.Action.CREATE,
+            model_name=model_name,
+            object_id=instance.pk,
+            object_repr=str(instance)[:255],
+            changes=None,
+            user=user,
+        )
+        for instance in created
+    ]
+    for instance, values in updated:
+        diff = {
+            field: {
+                "antes": str(before) if before is not None else None,
+                "despues": str(after) if after is not None else None,
+            }
+            for field, (before, after) in values.items()
+            if before != after
+        }
+        if diff:
+            entries.append(
+                AuditLog(
+                    action=AuditLog.Action.UPDATE,
+                    model_name=model_name,
+                    object_id=instance.pk,
+                    object_repr=str(instance)[:255],
+                    changes=diff,
+                    user=user,
+                )
+            )
+    AuditLog.objects.bulk_create(entries, batch_size=500)
+
+
 def _on_pre_save(sender, instance, **kwargs):
     if not instance.pk:
         instance._audit_is_new = True
@@ -90,17 +135,38 @@ def _configure_sqlite(sender, connection, **kwargs):
         cursor.execute("PRAGMA busy_timeout=20000;")
 
 
+def _invalidate_product_caches(sender, **kwargs):
+    from .views.common import _invalidate_product_caches as invalidate
+
+    invalidate()
+
+
+def _invalidate_ml_items_count(sender, **kwargs):
+    from .views.common import _invalidate_ml_items_count as invalidate
+
+    invalidate()
+
+
+def _invalidate_customer_debt(sender, **kwargs):
+    from .views.common import _invalidate_customer_debt as invalidate
+
+    invalidate()
+
+
 def connect_audit_signals():
     connection_created.connect(_configure_sqlite, weak=False)
 
     from .models import (
         Customer,
         CustomerPayment,
+        MercadoLibreItem,
         Product,
         Purchase,
         Sale,
+        StockMovement,
         Supplier,
         SupplierPayment,
+        SupplierProduct,
     )
 
     models = [Sale, Purchase, Product, Customer, Supplier, CustomerPayment, SupplierPayment]
@@ -108,3 +174,14 @@ def connect_audit_signals():
         pre_save.connect(_on_pre_save, sender=model, weak=False)
         post_save.connect(_on_post_save, sender=model, weak=False)
         pre_delete.connect(_on_pre_delete, sender=model, weak=False)
+
+    # Las búsquedas cacheadas incluyen el último costo de compra, que sale de
+    # SupplierProduct y StockMovement.
+    for model in (Product, SupplierProduct, StockMovement):
+        post_save.connect(_invalidate_product_caches, sender=model, weak=False)
+        post_delete.connect(_invalidate_product_caches, sender=model, weak=False)
+    post_save.connect(_invalidate_ml_items_count, sender=MercadoLibreItem, weak=False)
+    post_delete.connect(_invalidate_ml_items_count, sender=MercadoLibreItem, weak=False)
+    for model in (Sale, CustomerPayment, Customer):
+        post_save.connect(_invalidate_customer_debt, sender=model, weak=False)
+        post_delete.connect(_invalidate_customer_debt, sender=model, weak=False)
@@ -1,12 +1,13 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from inventory import services
 from inventory.models import Product, StockMovement, Warehouse
 
 
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
 class InventoryServiceTests(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(username="tester", password="secret")
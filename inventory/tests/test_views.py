@@ -1,7 +1,8 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from inventory import services
@@ -19,6 +20,7 @@ from inventory.models import (
 )
 
 
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
 class DashboardViewTests(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(username="viewer", password="secret")
@@ -26,6 +28,8 @@ class DashboardViewTests(TestCase):
         self.comun = Warehouse.objects.get(type=Warehouse.WarehouseType.COMUN)
         self.supplier = Supplier.objects.create(name="Proveedor Test", phone="123")
         self.client.force_login(self.user)
+        # Caché en memoria propia de los tests: se limpia entre tests.
+        cache.clear()
 
     def test_dashboard_totals_and_ranking(self):
         services.register_entry(self.product, self.comun, Decimal("4"), Decimal("10.00"), self.user)
@@ -69,6 +73,25 @@ class DashboardViewTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertTrue(Product.objects.filter(sku="SKU-FORM").exists())
 
+    def test_create_product_without_sku_uses_next_numeric_suffix(self):
+        Product.objects.create(sku="ACMESHASUA0002", name="Shampoo Suave")
+        Product.objects.create(sku="ACMESHASUA0010", name="Shampoo Suave 2")
+        Product.objects.create(sku="ACMESHASUAX99", name="Shampoo Suave raro")
+        response = self.client.post(
+            reverse("inventory_create_product"),
+            {
+                "sku": "",
+                "name": "Shampoo Suave",
+                "group": "Acme",
+                "avg_cost": "10.00",
+                "margin_consumer": "20.00",
+                "margin_barber": "10.00",
+                "margin_distributor": "5.00",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Product.objects.filter(sku="ACMESHASUA0011").exists())
+
     def test_register_purchase_and_sale_from_dashboard(self):
         product = Product.objects.create(sku="SKU-FLOW", name="Flow", target_margin=Decimal("10.00"))
         response = self.client.post(
@@ -159,6 +182,57 @@ class DashboardViewTests(TestCase):
         self.assertEqual(products[0].barber_price, Decimal("66.55"))
         self.assertEqual(products[0].distributor_price, Decimal("63.525"))
 
+    def test_product_prices_group_options_refresh_after_product_save(self):
+        cache.clear()
+        Product.objects.create(sku="SKU-G1", name="Con marca", group="Alfa")
+        response = self.client.get(reverse("inventory_product_prices"))
+        self.assertEqual(list(response.context["group_options"]), ["Alfa"])
+
+        Product.objects.create(sku="SKU-G2", name="Otra marca", group="Beta")
+        response = self.client.get(reverse("inventory_product_prices"))
+        self.assertEqual(list(response.context["group_options"]), ["Alfa", "Beta"])
+
+    def test_product_search_cache_invalidated_on_product_save(self):
+        cache.clear()
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertEqual(len(response.json()["results"]), 1)
+
+        self.product.name = "Renombrado"
+        self.product.save()
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_product_search_cache_invalidated_on_avg_cost_update(self):
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertEqual(response.json()["results"][0]["avg_cost"], "0.00")
+
+        services.update_product_avg_costs(
+            [{"product": self.product, "qty": Decimal("2"), "cost_no_vat": Decimal("8.00")}]
+        )
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertEqual(response.json()["results"][0]["avg_cost"], "8.00")
+
+    def test_product_search_cache_invalidated_after_version_key_eviction(self):
+        from inventory.views.common import PRODUCT_SEARCH_VERSION_KEY
+
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertEqual(response.json()["results"][0]["avg_cost"], "0.00")
+
+        cache.delete(PRODUCT_SEARCH_VERSION_KEY)
+        services.update_product_avg_costs(
+            [{"product": self.product, "qty": Decimal("1"), "cost_no_vat": Decimal("5.00")}]
+        )
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertEqual(response.json()["results"][0]["avg_cost"], "5.00")
+
+    def test_product_search_cache_invalidated_on_supplier_cost(self):
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertIn("(costo: 0.00)", response.json()["results"][0]["label"])
+
+        SupplierProduct.objects.create(supplier=self.supplier, product=self.product, last_cost=Decimal("9.00"))
+        response = self.client.get(reverse("inventory_product_search"), {"q": "view"})
+        self.assertIn("(costo: 9.00)", response.json()["results"][0]["label"])
+
     def test_product_price_download(self):
         self.product.avg_cost = Decimal("100.00")
         self.product.margin_consumer = Decimal("20.00")
@@ -169,6 +243,43 @@ class DashboardViewTests(TestCase):
             response["Content-Type"], "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 
+    def test_product_price_download_contents(self):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        self.product.group = "Marca & Co"
+        self.product.price_consumer = Decimal("120.50")
+        self.product.save()
+        Product.objects.create(sku="SKU-V2", name="Otro <producto>", price_consumer=Decimal("10.00"))
+        response = self.client.get(reverse("inventory_product_prices_download", args=["consumer"]))
+        self.assertEqual(response.status_code, 200)
+        ws = load_workbook(BytesIO(response.content)).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ("Marca", "Producto", "Precio"))
+        self.assertEqual(rows[1], ("Marca & Co", "View Product", 120.5))
+        self.assertEqual(rows[2], ("", "Otro <producto>", 10))
+
+    def test_product_price_download_computes_margin_price_without_extra_queries(self):
+        from io import BytesIO
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from openpyxl import load_workbook
+
+        Product.objects.filter(pk=self.product.pk).update(
+            avg_cost=Decimal("50.00"), vat_percent=Decimal("21.00"), margin_barber=Decimal("10.00")
+        )
+        for idx in range(3):
+            Product.objects.create(sku=f"SKU-DL-{idx}", name=f"Descarga {idx}", avg_cost=Decimal("10.00"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("inventory_product_prices_download", args=["barber"]))
+        self.assertEqual(response.status_code, 200)
+        product_queries = [q for q in queries if "inventory_product" in q["sql"]]
+        self.assertEqual(len(product_queries), 1)
+        ws = load_workbook(BytesIO(response.content)).active
+        self.assertEqual(list(ws.iter_rows(values_only=True))[-1], ("", "View Product", 67.22))
+
     def test_bulk_update_margins_by_group_updates_only_matching_products(self):
         target = Product.objects.create(
             sku="SKU-BRAND-A",
@@ -403,6 +514,276 @@ class DashboardViewTests(TestCase):
         self.assertEqual(product.margin_barber, Decimal("24.00"))
         self.assertEqual(product.margin_distributor, Decimal("18.75"))
 
+    def test_product_costs_screen_loads_paginated(self):
+        response = self.client.get(reverse("inventory_product_costs"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page_obj"].number, 1)
+        self.assertEqual(len(response.context["formset"].forms), 1)
+
+    def test_product_costs_query_count_does_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse("inventory_product_costs"))
+        for idx in range(5):
+            Product.objects.create(sku=f"SKU-COST-{idx}", name=f"Costo {idx}", default_supplier=self.supplier)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse("inventory_product_costs"))
+        self.assertContains(response, "Proveedor Test")
+        self.assertEqual(len(many), len(few))
+
+    def test_product_costs_search_reaches_later_pages(self):
+        Product.objects.bulk_create(
+            [Product(sku=f"SKU-PAGE-{idx:03d}", name=f"Pagina {idx:03d}") for idx in range(205)]
+        )
+        Product.objects.create(sku="ZZZ-LAST", name="Ultimo", default_supplier=self.supplier)
+        response = self.client.get(reverse("inventory_product_costs"))
+        self.assertEqual(response.context["page_obj"].paginator.num_pages, 2)
+        self.assertNotContains(response, "Ultimo")
+        response = self.client.get(reverse("inventory_product_costs"), {"q": "proveedor test"})
+        self.assertEqual([p.name for p in response.context["products"]], ["Ultimo"])
+
+    def test_build_xlsx_strips_control_characters(self):
+        import io
+
+        from openpyxl import load_workbook
+
+        from inventory.views.utils_xlsx import _build_xlsx
+
+        content = _build_xlsx(["Pro\x0bducto"], [["Crema\x01 de\x1f manos\tfina"]])
+        ws = load_workbook(io.BytesIO(content), read_only=True).active
+        self.assertEqual(list(ws.iter_rows(values_only=True)), [("Producto",), ("Crema de manos\tfina",)])
+
+    def test_read_costs_xlsx_rows_pads_short_rows(self):
+        import io
+        import re
+        import zipfile
+
+        from openpyxl import Workbook
+
+        from inventory.views.utils_xlsx import _read_costs_xlsx_rows
+
+        wb = Workbook()
+        wb.active.append(["Marca", "Descripción", "Costo", "SKU"])
+        wb.active.append(["Acme", "Crema", 7])
+        saved = io.BytesIO()
+        wb.save(saved)
+        # Sin <dimension> (como exportan otras herramientas) openpyxl no rellena la fila.
+        source = zipfile.ZipFile(io.BytesIO(saved.getvalue()))
+        upload = io.BytesIO()
+        with zipfile.ZipFile(upload, "w") as target:
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename == "xl/worksheets/sheet1.xml":
+                    data = re.sub(rb"<dimension[^>]*/>", b"", data)
+                target.writestr(item, data)
+        upload.seek(0)
+        rows, error = _read_costs_xlsx_rows(upload)
+        self.assertIsNone(error)
+        self.assertEqual(rows, [("Acme", "Crema", Decimal("7.00"), "")])
+
+    def test_product_costs_import_xlsx_updates_and_creates(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from inventory.views.utils_xlsx import _build_xlsx
+
+        Product.objects.create(sku="ACMECRENUE0007", name="Crema anterior", group="Acme")
+        Product.objects.create(sku="ACMECRENUEX12", name="Crema rara", group="Acme")
+        content = _build_xlsx(
+            ["Marca", "Descripción", "Costo", "SKU"],
+            [
+                ["", "View Product", Decimal("12.50"), "sku-v"],
+                ["Acme", "Crema Nueva", Decimal("7.00"), ""],
+            ],
+            number_cols={3},
+        )
+        upload = SimpleUploadedFile(
+            "costos.xlsx",
+            content,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        response = self.client.post(
+            reverse("inventory_product_costs"), {"action": "import_costs", "file": upload}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.avg_cost, Decimal("12.50"))
+        created = Product.objects.get(name="Crema Nueva")
+        self.assertEqual(created.group, "Acme")
+        self.assertEqual(created.avg_cost, Decimal("7.00"))
+        self.assertEqual(created.sku, "ACMECRENUE0008")
+        from inventory.models import AuditLog
+
+        update_log = AuditLog.objects.get(
+            model_name="Product", object_id=self.product.pk, action=AuditLog.Action.UPDATE
+        )
+        self.assertEqual(update_log.changes, {"avg_cost": {"antes": "0.00", "despues": "12.50"}})
+        self.assertEqual(update_log.user, self.user)
+        self.assertTrue(
+            AuditLog.objects.filter(model_name="Product", object_id=created.pk, action=AuditLog.Action.CREATE).exists()
+        )
+
+    def test_import_products_csv_creates_and_updates(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        csv_content = (
+            "SKU,Grupo,Nombre,Costo unitario,IVA\n"
+            "SKU-V,Marca,View Product renombrado,15.00,21\n"
+            "SKU-CSV,Marca,Nuevo CSV,8.5,10.5\n"
+        ).encode("utf-8")
+        upload = SimpleUploadedFile("productos.csv", csv_content, content_type="text/csv")
+        response = self.client.post(reverse("inventory_import_products"), {"file": upload})
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "View Product renombrado")
+        self.assertEqual(self.product.avg_cost, Decimal("15.00"))
+        created = Product.objects.get(sku="SKU-CSV")
+        self.assertEqual(created.group, "Marca")
+        self.assertEqual(created.vat_percent, Decimal("10.50"))
+        from inventory.models import AuditLog
+
+        update_log = AuditLog.objects.get(
+            model_name="Product", object_id=self.product.pk, action=AuditLog.Action.UPDATE
+        )
+        self.assertEqual(update_log.changes["name"], {"antes": "View Product", "despues": "View Product renombrado"})
+        self.assertEqual(update_log.changes["avg_cost"], {"antes": "0.00", "despues": "15.00"})
+        self.assertEqual(update_log.changes["margin_barber"], {"antes": "20.00", "despues": "0.00"})
+        self.assertTrue(
+            AuditLog.objects.filter(model_name="Product", object_id=created.pk, action=AuditLog.Action.CREATE).exists()
+        )
+
+    def test_mercadolibre_link_item_sets_and_clears_product(self):
+        from inventory.models import MercadoLibreItem
+
+        item = MercadoLibreItem.objects.create(item_id="MLA1", title="Publicación")
+        url = reverse("inventory_mercadolibre_dashboard")
+        self.client.post(url, {"action": "link_item", "item_id": item.id, "product_id": self.product.id})
+        item.refresh_from_db()
+        self.assertEqual(item.product_id, self.product.id)
+        self.assertEqual(item.matched_name, "View Product")
+        self.client.post(url, {"action": "link_item", "item_id": item.id, "product_id": ""})
+        item.refresh_from_db()
+        self.assertIsNone(item.product_id)
+        self.assertEqual(item.matched_name, "")
+
+    def test_mercadolibre_dashboard_query_count_does_not_grow_with_items(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from inventory.models import MercadoLibreItem
+
+        url = reverse("inventory_mercadolibre_dashboard")
+        MercadoLibreItem.objects.create(item_id="MLA0", title="Pub 0", product=self.product)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for idx in range(1, 4):
+            MercadoLibreItem.objects.create(item_id=f"MLA{idx}", title=f"Pub {idx}", product=self.product)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertContains(response, "Pub 3")
+        self.assertEqual(len(many), len(few))
+
+    def test_mercadolibre_dashboard_caches_items_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from inventory.models import MercadoLibreItem
+
+        cache.clear()
+        url = reverse("inventory_mercadolibre_dashboard")
+        MercadoLibreItem.objects.create(item_id="MLA0", title="Pub 0", product=self.product)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(
+            any(q["sql"].startswith('SELECT COUNT(*) AS "__count" FROM "inventory_mercadolibreitem"') for q in queries.captured_queries)
+        )
+        MercadoLibreItem.objects.create(item_id="MLA1", title="Pub 1", product=self.product)
+        response = self.client.get(url)
+        self.assertEqual(response.context["page_obj"].paginator.count, 2)
+
+    def test_mercadolibre_webhook_stores_raw_payload(self):
+        from inventory.models import MercadoLibreNotification
+
+        url = reverse("inventory_mercadolibre_webhook")
+        body = '{"topic": "items", "resource": "/items/MLA1", "user_id": 7}'
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        notification = MercadoLibreNotification.objects.get()
+        self.assertEqual(notification.topic, "items")
+        self.assertEqual(notification.raw_payload, body)
+        response = self.client.post(url, b"\xff\xfe", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_costs_quick_update_saves_margin(self):
+        response = self.client.post(
+            reverse("inventory_product_costs"),
+            {
+                "action": "quick_update_cost",
+                "product_id": str(self.product.id),
+                "margin_consumer": "30,00",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"ok": True})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.margin_consumer, Decimal("30.00"))
+
+    def test_product_costs_bulk_margins_ajax_returns_json(self):
+        response = self.client.post(
+            reverse("inventory_product_costs"),
+            {"action": "bulk_update_margins", "margin_barber": "12"},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["ok"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.margin_barber, Decimal("12.00"))
+
+    def test_product_costs_bulk_update_invalid_form_returns_json_for_ajax(self):
+        response = self.client.post(
+            reverse("inventory_product_costs"),
+            {"action": "bulk_update", "cost_percent": "abc"},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()["ok"])
+        self.assertTrue(response.json()["msg"])
+
+    def test_product_costs_bulk_update_cost_percent(self):
+        Product.objects.filter(pk=self.product.pk).update(avg_cost=Decimal("10.00"))
+        response = self.client.post(
+            reverse("inventory_product_costs"),
+            {"action": "bulk_update", "cost_percent": "15", "supplier": str(self.supplier.id)},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.avg_cost, Decimal("11.50"))
+        self.assertEqual(self.product.default_supplier_id, self.supplier.id)
+        link = SupplierProduct.objects.get(supplier=self.supplier, product=self.product)
+        self.assertEqual(link.last_cost, Decimal("11.50"))
+        from inventory.models import AuditLog
+
+        logs = AuditLog.objects.filter(
+            model_name="Product", object_id=self.product.pk, action=AuditLog.Action.UPDATE
+        )
+        cost_logs = [log for log in logs if "avg_cost" in (log.changes or {})]
+        self.assertEqual(len(cost_logs), 1)
+        self.assertEqual(cost_logs[0].changes["avg_cost"], {"antes": "10.00", "despues": "11.50"})
+        self.assertEqual(cost_logs[0].user, self.user)
+
+    def test_product_info_returns_costs(self):
+        Product.objects.filter(pk=self.product.pk).update(
+            avg_cost=Decimal("10.00"), vat_percent=Decimal("21.00"), default_supplier=self.supplier
+        )
+        response = self.client.get(reverse("inventory_product_info"), {"product_id": self.product.id})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["default_supplier_id"], self.supplier.id)
+        self.assertEqual(data["avg_cost"], "10.00")
+        self.assertEqual(data["cost_with_vat"], "12.10")
+
     def test_product_margins_screen_loads(self):
         Product.objects.create(
             sku="SKU-MARG-VIEW",
@@ -568,6 +949,105 @@ class DashboardViewTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertFalse(Product.objects.filter(pk=product_to_delete.pk).exists())
 
+    def test_customers_debtors_balance(self):
+        from inventory.models import CustomerPayment
+
+        Kind = CustomerPayment.Kind
+        alice = Customer.objects.create(name="Alice")
+        bob = Customer.objects.create(name="Bob")
+        Customer.objects.create(name="Sin deuda")
+        Sale.objects.create(warehouse=self.comun, user=self.user, customer=alice, total=Decimal("100.00"))
+        Sale.objects.create(warehouse=self.comun, user=self.user, customer=bob, total=Decimal("50.00"))
+        CustomerPayment.objects.create(customer=alice, amount=Decimal("30.00"), kind=Kind.PAYMENT)
+        CustomerPayment.objects.create(customer=alice, amount=Decimal("5.00"), kind=Kind.REFUND)
+        CustomerPayment.objects.create(customer=alice, amount=Decimal("10.00"), kind=Kind.CREDIT_NOTE)
+        CustomerPayment.objects.create(customer=bob, amount=Decimal("50.00"), kind=Kind.PAYMENT)
+
+        response = self.client.get(reverse("inventory_customers"))
+        self.assertEqual(response.status_code, 200)
+        debtors = response.context["debtors"]
+        self.assertEqual([row["name"] for row in debtors], ["Alice"])
+        self.assertEqual(debtors[0]["balance"], Decimal("65.00"))
+        self.assertEqual(response.context["total_debt"], Decimal("65.00"))
+
+        CustomerPayment.objects.create(customer=alice, amount=Decimal("65.00"), kind=Kind.PAYMENT)
+        response = self.client.get(reverse("inventory_customers"))
+        self.assertEqual(response.context["debtors"], [])
+        self.assertEqual(response.context["total_debt"], Decimal("0.00"))
+
+    def test_customers_debtors_refresh_after_version_key_eviction(self):
+        from inventory.models import CustomerPayment
+        from inventory.views.common import CUSTOMER_DEBT_VERSION_KEY
+
+        alice = Customer.objects.create(name="Alice")
+        Sale.objects.create(warehouse=self.comun, user=self.user, customer=alice, total=Decimal("40.00"))
+        response = self.client.get(reverse("inventory_customers"))
+        self.assertEqual(response.context["total_debt"], Decimal("40.00"))
+
+        cache.delete(CUSTOMER_DEBT_VERSION_KEY)
+        CustomerPayment.objects.create(customer=alice, amount=Decimal("40.00"), kind=CustomerPayment.Kind.PAYMENT)
+        response = self.client.get(reverse("inventory_customers"))
+        self.assertEqual(response.context["debtors"], [])
+
+    def test_customers_update_phone_reports_missing_customer(self):
+        customer = Customer.objects.create(name="Cliente Tel")
+        url = reverse("inventory_customers")
+        response = self.client.post(url, {"action": "update_customer_phone", "customer_id": customer.id, "phone": "555"})
+        self.assertEqual(response.status_code, 302)
+        customer.refresh_from_db()
+        self.assertEqual(customer.email, "555")
+        response = self.client.post(url, {"action": "update_customer_phone", "customer_id": customer.id + 99, "phone": "1"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_customer_history_ledger_running_balance(self):
+        from datetime import date, datetime
+
+        from django.utils import timezone
+
+        from inventory.models import CustomerPayment
+
+        customer = Customer.objects.create(name="Cliente Ledger")
+        response = self.client.get(reverse("inventory_customer_history", args=[customer.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["ledger_entries"], [])
+        self.assertEqual(response.context["current_balance"], Decimal("0.00"))
+
+        first = Sale.objects.create(warehouse=self.comun, user=self.user, customer=customer, total=Decimal("100.00"))
+        second = Sale.objects.create(warehouse=self.comun, user=self.user, customer=customer, total=Decimal("40.00"))
+        Sale.objects.filter(pk=first.pk).update(created_at=timezone.make_aware(datetime(2026, 1, 1, 10)))
+        Sale.objects.filter(pk=second.pk).update(created_at=timezone.make_aware(datetime(2026, 1, 3, 10)))
+        CustomerPayment.objects.create(customer=customer, amount=Decimal("30.00"), paid_at=date(2026, 1, 2))
+        CustomerPayment.objects.create(
+            customer=customer, amount=Decimal("5.00"), kind=CustomerPayment.Kind.REFUND, paid_at=date(2026, 1, 4)
+        )
+
+        response = self.client.get(reverse("inventory_customer_history", args=[customer.id]))
+        self.assertEqual(response.status_code, 200)
+        ledger = response.context["ledger_entries"]
+        self.assertEqual(
+            [entry["balance"] for entry in ledger],
+            [Decimal("100.00"), Decimal("70.00"), Decimal("110.00"), Decimal("115.00")],
+        )
+        self.assertEqual(response.context["current_balance"], Decimal("115.00"))
+
+        CustomerPayment.objects.create(customer=customer, sale=first, amount=Decimal("60.00"))
+        CustomerPayment.objects.create(
+            customer=customer, sale=first, amount=Decimal("10.00"), kind=CustomerPayment.Kind.REFUND
+        )
+        response = self.client.get(reverse("inventory_customer_history", args=[customer.id]))
+        row = next(row for row in response.context["sales_rows"] if row["sale"].pk == first.pk)
+        self.assertEqual(row["paid_total"], Decimal("50.00"))
+        self.assertEqual(row["balance"], Decimal("50.00"))
+        self.assertEqual(row["methods"], "Efectivo")
+
+    def test_customers_list_is_paginated_and_searchable(self):
+        Customer.objects.bulk_create([Customer(name=f"Cliente {idx:03d}") for idx in range(105)])
+        response = self.client.get(reverse("inventory_customers"))
+        self.assertEqual(len(response.context["customers"]), 100)
+        self.assertEqual(response.context["page_obj"].paginator.num_pages, 2)
+        response = self.client.get(reverse("inventory_customers"), {"q": "cliente 104"})
+        self.assertEqual([c.name for c in response.context["customers"]], ["Cliente 104"])
+
     def test_customers_and_discounts(self):
         customer_data = {"name": "Cliente 1", "email": "c1@example.com", "audience": "CONSUMER"}
         response = self.client.post(reverse("inventory_customers"), {"action": "create_customer", **customer_data})
@@ -593,3 +1073,15 @@ class DashboardViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 302)
         self.assertTrue(customer.discounts.filter(product=product).exists())
+
+        response = self.client.post(
+            reverse("inventory_customers"),
+            {
+                "action": "create_discount",
+                "customer": customer.id,
+                "product": product.id,
+                "discount_percent": "7.50",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(customer.discounts.get(product=product).discount_percent, Decimal("7.50"))
@@ -2,12 +2,15 @@
 import json
 import os
 import re
+from datetime import date
 from decimal import Decimal
+from functools import lru_cache
 
 from django.contrib.auth.decorators import login_required
 from django.db import connection
 from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
 try:
@@ -224,20 +227,25 @@ REGLA CRÍTICA — NUNCA INVENTES DATOS:
 """ + _SCHEMA
 
 
-def _build_system_prompt() -> str:
-    from django.utils import timezone as _tz
-    import locale as _locale
-    now = _tz.localtime(_tz.now())
-    month_names = [
-        "", "enero", "febrero", "marzo", "abril", "mayo", "junio",
-        "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
-    ]
+_MONTH_NAMES = [
+    "", "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
+]
+
+
+@lru_cache(maxsize=1)
+def _system_prompt_for(day: date) -> str:
     return _SYSTEM_PROMPT_TEMPLATE.format(
-        today=now.strftime("%d/%m/%Y"),
-        year=now.year,
-        month_name=month_names[now.month],
+        today=day.strftime("%d/%m/%Y"),
+        year=day.year,
+        month_name=_MONTH_NAMES[day.month],
     )
 
+
+def _build_system_prompt() -> str:
+    # El prompt solo cambia con la fecha: se arma una vez por día.
+    return _system_prompt_for(timezone.localdate())
+
 _FORBIDDEN_RE = re.compile(
     r"\b(INSERT|UPDATE|DELETE|DROP|TRUNCATE|ALTER|CREATE|GRANT|REVOKE|EXECUTE|CALL|COPY)\b",
     re.IGNORECASE,
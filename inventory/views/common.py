@@ -1,9 +1,12 @@
 """Shared helper functions used by multiple view modules."""
 from decimal import Decimal, ROUND_HALF_UP
+import hashlib
 import re
 import unicodedata
 import json
+import time
 
+from django.core.cache import cache
 from django.db.models import DecimalField, Value, Subquery, OuterRef
 from django.db.models.functions import Coalesce
 
@@ -17,6 +20,19 @@ from ..models import (
     SupplierProduct,
 )
 
+GROUP_OPTIONS_CACHE_KEY = "inventory:group_options"
+GROUP_OPTIONS_CACHE_TIMEOUT = 300
+# Las búsquedas cacheadas llevan este número de versión en la clave; las señales
+# de Product lo incrementan y así invalidan todas las búsquedas de una vez.
+PRODUCT_SEARCH_VERSION_KEY = "inventory:product_search:version"
+PRODUCT_SEARCH_CACHE_TIMEOUT = 60
+# Mismo esquema para el total de publicaciones que pagina el tablero de ML.
+ML_ITEMS_COUNT_VERSION_KEY = "inventory:ml_items_count:version"
+ML_ITEMS_COUNT_CACHE_TIMEOUT = 60
+# Panel de deudores de clientes: ventas, pagos y clientes incrementan la versión.
+CUSTOMER_DEBT_VERSION_KEY = "inventory:customer_debt:version"
+CUSTOMER_DEBT_CACHE_TIMEOUT = 300
+
 
 def _products_with_last_cost_queryset():
     supplier_cost = (
@@ -39,6 +55,70 @@ def _products_with_last_cost_queryset():
     )
 
 
+def _product_group_options() -> list[str]:
+    """Marcas/grupos distintos de los productos, para los datalist de filtros.
+
+    Se cachea porque es un SELECT DISTINCT sobre toda la tabla; las señales de
+    Product lo invalidan al guardar o borrar un producto.
+    """
+    return cache.get_or_set(
+        GROUP_OPTIONS_CACHE_KEY,
+        lambda: list(
+            Product.objects.exclude(group="")
+            .exclude(group__isnull=True)
+            .values_list("group", flat=True)
+            .distinct()
+            .order_by("group")
+        ),
+        GROUP_OPTIONS_CACHE_TIMEOUT,
+    )
+
+
+def _cache_version(key: str) -> int:
+    # Se siembra con time_ns y no con 1: si la clave de versión se pierde
+    # (desalojo, reinicio), la nueva nunca coincide con entradas viejas.
+    return cache.get_or_set(key, time.time_ns, None)
+
+
+def _bump_version(key: str) -> None:
+    # Siempre una versión nueva con set(), no incr(): en FileBasedCache incr es
+    # get+set entre procesos y dos invalidaciones simultáneas podían quedar en
+    # una; también cubre la clave desalojada.
+    cache.set(key, time.time_ns(), None)
+
+
+def _product_search_cache_key(term: str) -> str:
+    version = _cache_version(PRODUCT_SEARCH_VERSION_KEY)
+    digest = hashlib.md5(term.lower().encode("utf-8")).hexdigest()
+    return f"inventory:product_search:{version}:{digest}"
+
+
+def _ml_items_count_cache_key(term: str) -> str:
+    version = _cache_version(ML_ITEMS_COUNT_VERSION_KEY)
+    digest = hashlib.md5(term.lower().encode("utf-8")).hexdigest()
+    return f"inventory:ml_items_count:{version}:{digest}"
+
+
+def _invalidate_ml_items_count() -> None:
+    _bump_version(ML_ITEMS_COUNT_VERSION_KEY)
+
+
+def _customer_debt_cache_key() -> str:
+    version = _cache_version(CUSTOMER_DEBT_VERSION_KEY)
+    return f"inventory:customer_debtors:{version}"
+
+
+def _invalidate_customer_debt() -> None:
+    _bump_version(CUSTOMER_DEBT_VERSION_KEY)
+
+
+def _invalidate_product_caches() -> None:
+    """Descarta grupos y búsquedas cacheadas; lo usan las señales de Product y
+    los update() masivos, que no disparan señales."""
+    cache.delete(GROUP_OPTIONS_CACHE_KEY)
+    _bump_version(PRODUCT_SEARCH_VERSION_KEY)
+
+
 def _product_label_with_last_cost(obj: Product) -> str:
     if getattr(obj, "is_kit", False):
         last_cost = obj.cost_with_vat()
@@ -1,11 +1,29 @@
 """Customer views."""
 from datetime import datetime, time
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import heapq
+from operator import itemgetter
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import (
+    Case,
+    DecimalField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
@@ -17,9 +35,9 @@ from ..models import (
     CustomerPayment,
     CustomerProductDiscount,
     CustomerProductPrice,
-    Product,
     Sale,
 )
+from .common import CUSTOMER_DEBT_CACHE_TIMEOUT, _customer_debt_cache_key, _product_group_options
 from .forms import (
     CustomerCreditNoteForm,
     CustomerDiscountForm,
@@ -30,6 +48,66 @@ from .forms import (
 )
 
 
+_AUDIENCE_CHOICES = tuple(Customer.Audience.choices)
+_VALID_AUDIENCES = frozenset(Customer.Audience.values)
+_METHOD_LABELS = dict(CustomerPayment.Method.choices)
+# Tipos de movimiento ligados una vez para los bucles del historial.
+_PAYMENT = CustomerPayment.Kind.PAYMENT
+_REFUND = CustomerPayment.Kind.REFUND
+_CREDIT_NOTE = CustomerPayment.Kind.CREDIT_NOTE
+_CREDIT_KINDS = frozenset((_PAYMENT, _CREDIT_NOTE))
+_MONEY = DecimalField(max_digits=14, decimal_places=2)
+_ZERO = Value(Decimal("0.00"), output_field=_MONEY)
+
+
+def _customers_with_balance():
+    """Clientes anotados con balance = ventas - pagos + devoluciones - notas de crédito.
+
+    Cada suma va en su propia subconsulta: sumar ventas y pagos con joins en el
+    mismo annotate duplicaría filas.
+    """
+    sales = (
+        Sale.objects.filter(customer=OuterRef("pk"))
+        .order_by()
+        .values("customer")
+        .annotate(total=Sum("total"))
+        .values("total")
+    )
+    # Pagos y notas de crédito restan deuda; las devoluciones la suman.
+    signed_amount = Case(
+        When(kind=_REFUND, then=-F("amount")),
+        default=F("amount"),
+        output_field=_MONEY,
+    )
+    movements = (
+        CustomerPayment.objects.filter(customer=OuterRef("pk"))
+        .order_by()
+        .values("customer")
+        .annotate(total=Sum(signed_amount))
+        .values("total")
+    )
+    return Customer.objects.annotate(
+        balance=ExpressionWrapper(
+            Coalesce(Subquery(sales, output_field=_MONEY), _ZERO)
+            - Coalesce(Subquery(movements, output_field=_MONEY), _ZERO),
+            output_field=_MONEY,
+        )
+    )
+
+
+def _debtors_panel():
+    """Total adeudado y los 8 mayores deudores; la deuda se calcula en la base.
+
+    Se cachea por versión: las señales de Sale, CustomerPayment y Customer la
+    incrementan.
+    """
+    debtor_qs = _customers_with_balance().filter(balance__gt=0)
+    total_debt = debtor_qs.aggregate(total=Coalesce(Sum("balance"), _ZERO))["total"]
+    # Dicts livianos: el panel solo muestra nombre y saldo (y se guardan en cache).
+    debtors = list(debtor_qs.order_by("-balance", "name").values("id", "name", "balance")[:8])
+    return total_debt, debtors
+
+
 @login_required
 def customers_view(request):
     customer_form = CustomerForm()
@@ -53,10 +131,12 @@ def customers_view(request):
                 customer = discount_form.cleaned_data["customer"]
                 product = discount_form.cleaned_data["product"]
                 discount = discount_form.cleaned_data["discount_percent"]
-                CustomerProductDiscount.objects.update_or_create(
-                    customer=customer,
-                    product=product,
-                    defaults={"discount_percent": discount},
+                # Upsert en un solo INSERT ... ON CONFLICT sobre (customer, product).
+                CustomerProductDiscount.objects.bulk_create(
+                    [CustomerProductDiscount(customer=customer, product=product, discount_percent=discount)],
+                    update_conflicts=True,
+                    unique_fields=["customer", "product"],
+                    update_fields=["discount_percent"],
                 )
                 messages.success(request, "Descuento asignado.")
                 return redirect("inventory_customers")
@@ -68,10 +148,11 @@ def customers_view(request):
                 customer = group_discount_form.cleaned_data["customer"]
                 group = (group_discount_form.cleaned_data["group"] or "").strip()
                 discount = group_discount_form.cleaned_data["discount_percent"]
-                CustomerGroupDiscount.objects.update_or_create(
-                    customer=customer,
-                    group=group,
-                    defaults={"discount_percent": discount},
+                CustomerGroupDiscount.objects.bulk_create(
+                    [CustomerGroupDiscount(customer=customer, group=group, discount_percent=discount)],
+                    update_conflicts=True,
+                    unique_fields=["customer", "group"],
+                    update_fields=["discount_percent"],
                 )
                 messages.success(request, "Descuento por grupo asignado.")
                 return redirect("inventory_customers")
@@ -116,65 +197,57 @@ def customers_view(request):
         elif action == "update_customer_audience":
             customer_id = request.POST.get("customer_id")
             audience = request.POST.get("audience")
-            valid_audiences = {choice[0] for choice in Customer.Audience.choices}
-            if customer_id and audience in valid_audiences:
+            # update() devuelve las filas tocadas: 0 si el cliente no existe.
+            if customer_id and audience in _VALID_AUDIENCES and (
                 Customer.objects.filter(id=customer_id).update(audience=audience)
+            ):
                 messages.success(request, "Tipo de cliente actualizado.")
                 return redirect("inventory_customers")
             messages.error(request, "Revisá el tipo de cliente.")
         elif action == "update_customer_phone":
             customer_id = request.POST.get("customer_id")
             phone = (request.POST.get("phone") or "").strip()
-            if customer_id:
-                Customer.objects.filter(id=customer_id).update(email=phone)
+            # El teléfono se guarda en email (CustomerForm lo rotula "Teléfono").
+            if customer_id and Customer.objects.filter(id=customer_id).update(email=phone):
                 messages.success(request, "Teléfono actualizado.")
                 return redirect("inventory_customers")
             messages.error(request, "No se pudo actualizar el teléfono.")
 
-    customers = Customer.objects.prefetch_related("discounts__product", "group_discounts", "custom_prices__product").order_by("name")
-    sales_totals = {
-        row["customer_id"]: row["total"] or Decimal("0.00")
-        for row in Sale.objects.filter(customer__isnull=False)
-        .values("customer_id")
-        .annotate(total=Sum("total"))
-    }
-    payments_totals = {
-        row["customer_id"]: row["total"] or Decimal("0.00")
-        for row in CustomerPayment.objects.filter(kind=CustomerPayment.Kind.PAYMENT)
-        .values("customer_id")
-        .annotate(total=Sum("amount"))
-    }
-    refunds_totals = {
-        row["customer_id"]: row["total"] or Decimal("0.00")
-        for row in CustomerPayment.objects.filter(kind=CustomerPayment.Kind.REFUND)
-        .values("customer_id")
-        .annotate(total=Sum("amount"))
-    }
-    credit_notes_totals = {
-        row["customer_id"]: row["total"] or Decimal("0.00")
-        for row in CustomerPayment.objects.filter(kind=CustomerPayment.Kind.CREDIT_NOTE)
-        .values("customer_id")
-        .annotate(total=Sum("amount"))
-    }
-    debtors = []
-    total_debt = Decimal("0.00")
-    for customer in customers:
-        sales_total = sales_totals.get(customer.id, Decimal("0.00"))
-        payments_total = payments_totals.get(customer.id, Decimal("0.00"))
-        refunds_total = refunds_totals.get(customer.id, Decimal("0.00"))
-        credit_notes_total = credit_notes_totals.get(customer.id, Decimal("0.00"))
-        balance = sales_total - payments_total + refunds_total - credit_notes_total
-        if balance > 0:
-            debtors.append({"customer": customer, "balance": balance})
-            total_debt += balance
-    debtors.sort(key=lambda item: item["balance"], reverse=True)
-    debtors = debtors[:8]
-    group_options = list(
-        Product.objects.exclude(group__exact="")
-        .values_list("group", flat=True)
-        .distinct()
-        .order_by("group")
+    # La grilla solo muestra nombre/teléfono/tipo y, de las reglas, SKU y valores.
+    customers = (
+        Customer.objects.only("id", "name", "email", "audience")
+        .prefetch_related(
+            Prefetch(
+                "discounts",
+                queryset=CustomerProductDiscount.objects.select_related("product")
+                .only("id", "customer", "product__sku", "discount_percent")
+                .order_by("product__sku"),
+            ),
+            Prefetch(
+                "group_discounts",
+                queryset=CustomerGroupDiscount.objects.only("id", "customer", "group", "discount_percent").order_by(
+                    "group"
+                ),
+            ),
+            Prefetch(
+                "custom_prices",
+                queryset=CustomerProductPrice.objects.select_related("product")
+                .only("id", "customer", "product__sku", "unit_price", "unit_cost")
+                .order_by("product__sku"),
+            ),
+        )
+        .order_by("name")
+    )
+    search_query = (request.GET.get("q") or "").strip()
+    if search_query:
+        customers = customers.filter(name__icontains=search_query)
+    # Se pagina antes de evaluar: los prefetch solo cargan reglas de la página visible.
+    paginator = Paginator(customers, 100)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    total_debt, debtors = cache.get_or_set(
+        _customer_debt_cache_key(), _debtors_panel, CUSTOMER_DEBT_CACHE_TIMEOUT
     )
+    group_options = _product_group_options()
     return render(
         request,
         "inventory/customers.html",
@@ -183,8 +256,10 @@ def customers_view(request):
             "discount_form": discount_form,
             "group_discount_form": group_discount_form,
             "custom_price_form": custom_price_form,
-            "customers": customers,
-            "audience_choices": Customer.Audience.choices,
+            "customers": page_obj.object_list,
+            "page_obj": page_obj,
+            "search_query": search_query,
+            "audience_choices": _AUDIENCE_CHOICES,
             "group_options": group_options,
             "total_debt": total_debt,
             "debtors": debtors,
@@ -194,7 +269,11 @@ def customers_view(request):
 
 @login_required
 def customer_history_view(request, customer_id):
-    customer = get_object_or_404(Customer, id=customer_id)
+    # EXISTS en la misma consulta del cliente: sin ventas se evita el GROUP BY de abajo.
+    customer = get_object_or_404(
+        Customer.objects.annotate(has_sales=Exists(Sale.objects.filter(customer=OuterRef("pk")))),
+        id=customer_id,
+    )
     payment_form = CustomerPaymentForm(customer=customer)
     credit_note_form = CustomerCreditNoteForm(customer=customer)
 
@@ -245,51 +324,85 @@ def customer_history_view(request, customer_id):
                     messages.error(request, "No se puede editar ese movimiento.")
             return redirect("inventory_customer_history", customer_id=customer.id)
 
-    sales = list(
-        Sale.objects.filter(customer=customer)
-        .select_related("warehouse")
-        .order_by("-created_at", "-id")
+    # Lo cobrado por venta se suma en la base: los pagos suman, devoluciones y
+    # notas de crédito imputadas a la venta restan.
+    paid_total = Coalesce(
+        Sum(
+            Case(
+                When(payments__kind=_PAYMENT, then=F("payments__amount")),
+                default=-F("payments__amount"),
+                output_field=_MONEY,
+            ),
+            filter=Q(payments__customer=customer),
+        ),
+        _ZERO,
     )
-    payments = list(
-        CustomerPayment.objects.filter(customer=customer)
-        .select_related("sale")
-        .order_by("-paid_at", "-id")
+    sales = (
+        list(
+            Sale.objects.filter(customer=customer)
+            .select_related("warehouse")
+            .annotate(paid_total=paid_total)
+            .order_by("-created_at", "-id")
+        )
+        if customer.has_sales
+        else []
     )
+    # Las ventas del cliente ya están en memoria: no hace falta el JOIN con sale.
+    sales_by_id = {sale.id: sale for sale in sales}
+    payments = list(CustomerPayment.objects.filter(customer=customer).order_by("-paid_at", "-id"))
+
+    zero = Decimal("0.00")
+    context = {
+        "customer": customer,
+        "sales_rows": [],
+        "payments": payments,
+        "payment_form": payment_form,
+        "credit_note_form": credit_note_form,
+        "ledger_entries": [],
+        "total_sales": zero,
+        "total_payments": zero,
+        "total_refunds": zero,
+        "total_credit_notes": zero,
+        "current_balance": zero,
+    }
+    # Cliente sin movimientos: no hay ledger ni totales que armar.
+    if not sales and not payments:
+        return render(request, "inventory/customer_history.html", context)
 
-    payment_by_sale = {}
+    # Los totales se acumulan en las mismas pasadas que arman las filas.
+    totals_by_kind = dict.fromkeys(CustomerPayment.Kind.values, Decimal("0.00"))
+    methods_by_sale = {}
     for payment in payments:
-        if not payment.sale_id:
-            continue
-        sale_id = payment.sale_id
-        info = payment_by_sale.setdefault(
-            sale_id,
-            {"paid_total": Decimal("0.00"), "methods": []},
-        )
-        signed = payment.amount if payment.kind == CustomerPayment.Kind.PAYMENT else -payment.amount
-        info["paid_total"] += signed
-        info["methods"].append(payment.get_method_display())
+        if payment.kind in totals_by_kind:
+            totals_by_kind[payment.kind] += payment.amount
+        if payment.sale_id and payment.method:
+            # dict como conjunto ordenado: deduplica el método al cargarlo.
+            methods_by_sale.setdefault(payment.sale_id, {})[payment.method] = None
 
+    total_sales = Decimal("0.00")
     sales_rows = []
     for sale in sales:
-        paid_info = payment_by_sale.get(sale.id) or {"paid_total": Decimal("0.00"), "methods": []}
-        paid_total = paid_info["paid_total"]
-        balance = sale.total - paid_total
-        methods = ", ".join(dict.fromkeys([m for m in paid_info["methods"] if m])) or "-"
+        total_sales += sale.total
+        methods = ", ".join(_METHOD_LABELS.get(m, m) for m in methods_by_sale.get(sale.id, ())) or "-"
         sales_rows.append(
             {
                 "sale": sale,
-                "paid_total": paid_total,
+                "paid_total": sale.paid_total,
                 "methods": methods,
-                "balance": balance,
+                "balance": sale.total - sale.paid_total,
             }
         )
 
-    ledger_entries = []
+    # La zona horaria se resuelve una vez; el inicio de cada día de pago se
+    # calcula una sola vez aunque haya varios pagos en la misma fecha.
+    tz = timezone.get_current_timezone()
+    day_starts = {}
+    sale_entries = []
     for sale in sales:
         sale_date = sale.created_at
         if timezone.is_naive(sale_date):
-            sale_date = timezone.make_aware(sale_date, timezone.get_current_timezone())
-        ledger_entries.append(
+            sale_date = timezone.make_aware(sale_date, tz)
+        sale_entries.append(
             {
                 "date": sale_date,
                 "date_display": sale.created_at,
@@ -301,28 +414,32 @@ def customer_history_view(request, customer_id):
                 "payment_id": None,
             }
         )
+    payment_entries = []
     for payment in payments:
         kind = payment.kind
-        is_credit = kind in (CustomerPayment.Kind.PAYMENT, CustomerPayment.Kind.CREDIT_NOTE)
+        is_credit = kind in _CREDIT_KINDS
         debit = Decimal("0.00") if is_credit else payment.amount
         credit = payment.amount if is_credit else Decimal("0.00")
-        if kind == CustomerPayment.Kind.PAYMENT:
+        if kind == _PAYMENT:
             label = "Pago"
-            detail_prefix = payment.get_method_display()
-        elif kind == CustomerPayment.Kind.CREDIT_NOTE:
+            detail_prefix = _METHOD_LABELS.get(payment.method, payment.method)
+        elif kind == _CREDIT_NOTE:
             label = "Nota de crédito"
             detail_prefix = "NC"
         else:
             label = "Devolución/Ajuste"
-            detail_prefix = payment.get_method_display()
+            detail_prefix = _METHOD_LABELS.get(payment.method, payment.method)
         detail_parts = [detail_prefix]
-        if payment.sale_id:
-            detail_parts.append(payment.sale.ml_order_id or payment.sale.invoice_number)
+        sale_obj = sales_by_id.get(payment.sale_id)
+        if sale_obj is not None:
+            detail_parts.append(sale_obj.ml_order_id or sale_obj.invoice_number)
         if payment.notes:
             detail_parts.append(payment.notes)
-        payment_date = datetime.combine(payment.paid_at, time.min)
-        payment_date = timezone.make_aware(payment_date, timezone.get_current_timezone())
-        ledger_entries.append(
+        payment_date = day_starts.get(payment.paid_at)
+        if payment_date is None:
+            payment_date = timezone.make_aware(datetime.combine(payment.paid_at, time.min), tz)
+            day_starts[payment.paid_at] = payment_date
+        payment_entries.append(
             {
                 "date": payment_date,
                 "date_display": payment.paid_at,
@@ -341,45 +458,33 @@ def customer_history_view(request, customer_id):
             }
         )
 
-    ledger_entries.sort(key=lambda item: item["date"])
+    # Ventas y pagos ya vienen ordenados de la base (descendente): recorridos al
+    # revés se intercalan por fecha con un merge lineal, sin ordenar de nuevo, y
+    # el saldo corrido se acumula en la misma pasada.
+    ledger_entries = []
     balance = Decimal("0.00")
-    for entry in ledger_entries:
-        balance += entry["debit"]
-        balance -= entry["credit"]
+    for entry in heapq.merge(reversed(sale_entries), reversed(payment_entries), key=itemgetter("date")):
+        balance += entry["debit"] - entry["credit"]
         entry["balance"] = balance
+        ledger_entries.append(entry)
 
-    total_sales = sum((sale.total for sale in sales), Decimal("0.00"))
-    total_payments = sum(
-        (p.amount for p in payments if p.kind == CustomerPayment.Kind.PAYMENT),
-        Decimal("0.00"),
-    )
-    total_refunds = sum(
-        (p.amount for p in payments if p.kind == CustomerPayment.Kind.REFUND),
-        Decimal("0.00"),
-    )
-    total_credit_notes = sum(
-        (p.amount for p in payments if p.kind == CustomerPayment.Kind.CREDIT_NOTE),
-        Decimal("0.00"),
-    )
+    total_payments = totals_by_kind[_PAYMENT]
+    total_refunds = totals_by_kind[_REFUND]
+    total_credit_notes = totals_by_kind[_CREDIT_NOTE]
     current_balance = total_sales - total_payments + total_refunds - total_credit_notes
 
-    return render(
-        request,
-        "inventory/customer_history.html",
+    context.update(
         {
-            "customer": customer,
             "sales_rows": sales_rows,
-            "payments": payments,
-            "payment_form": payment_form,
-            "credit_note_form": credit_note_form,
             "ledger_entries": ledger_entries,
             "total_sales": total_sales,
             "total_payments": total_payments,
             "total_refunds": total_refunds,
             "total_credit_notes": total_credit_notes,
             "current_balance": current_balance,
-        },
+        }
     )
+    return render(request, "inventory/customer_history.html", context)
 
 
 @login_required
@@ -343,6 +343,12 @@ class CustomerDiscountForm(forms.ModelForm):
             "discount_percent": "Descuento %",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Los <select> solo muestran nombre/SKU; no hace falta traer filas completas.
+        self.fields["customer"].queryset = Customer.objects.only("id", "name")
+        self.fields["product"].queryset = Product.objects.only("id", "name", "sku")
+
     def validate_unique(self):
         return
 
@@ -357,6 +363,10 @@ class CustomerGroupDiscountForm(forms.ModelForm):
             "discount_percent": "Descuento %",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["customer"].queryset = Customer.objects.only("id", "name")
+
     def validate_unique(self):
         return
 
@@ -372,6 +382,11 @@ class CustomerProductPriceForm(forms.ModelForm):
             "unit_cost": "Costo fijo (opcional)",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["customer"].queryset = Customer.objects.only("id", "name")
+        self.fields["product"].queryset = Product.objects.only("id", "name", "sku")
+
     def validate_unique(self):
         return
 
@@ -1,20 +1,23 @@
 """MercadoLibre views."""
-import json
 import secrets
 from datetime import timedelta
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.db.utils import OperationalError
 from django.http import HttpResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from urllib.error import HTTPError
 
+import orjson
+
 from .. import mercadolibre as ml
 from .. import services
 from ..models import (
@@ -27,9 +30,27 @@ from ..models import (
     Stock,
     Warehouse,
 )
+from .common import ML_ITEMS_COUNT_CACHE_TIMEOUT, _invalidate_ml_items_count, _ml_items_count_cache_key
 from django.contrib.auth.decorators import login_required
 
 
+class _CachedCountPaginator(Paginator):
+    """Paginator que guarda el COUNT(*) en cache; con filtros icontains sobre
+    todo el catálogo ese conteo es la consulta más cara de la página."""
+
+    def __init__(self, object_list, per_page, *, cache_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count, ML_ITEMS_COUNT_CACHE_TIMEOUT)
+        return count
+
+
 @login_required
 @require_http_methods(["GET"])
 def mercadolibre_connect(request):
@@ -100,7 +121,24 @@ def mercadolibre_dashboard(request):
     missing_credentials = not settings.ML_CLIENT_ID or not settings.ML_CLIENT_SECRET or not settings.ML_REDIRECT_URI
     try:
         connection = MercadoLibreConnection.objects.filter(user=request.user).first()
-        items_qs = MercadoLibreItem.objects.select_related("product")
+        # Solo las columnas que usan la grilla y el semáforo.
+        items_qs = MercadoLibreItem.objects.select_related("product").only(
+            "id",
+            "item_id",
+            "title",
+            "status",
+            "permalink",
+            "logistic_type",
+            "available_quantity",
+            "units_sold_30d",
+            "last_sold_at",
+            "product__id",
+            "product__name",
+            "product__group",
+            "product__avg_cost",
+            "product__margin_consumer",
+            "product__min_stock",
+        )
     except OperationalError:
         messages.error(request, "Faltan tablas de MercadoLibre. Ejecutá migrate y recargá.")
         connection = None
@@ -108,14 +146,14 @@ def mercadolibre_dashboard(request):
     metrics = {}
     if connection and connection.last_metrics:
         try:
-            metrics = json.loads(connection.last_metrics)
-        except json.JSONDecodeError:
+            metrics = orjson.loads(connection.last_metrics)
+        except orjson.JSONDecodeError:
             metrics = {}
     search_query = (request.GET.get("q") or "").strip()
     if search_query:
         items_qs = items_qs.filter(title__icontains=search_query)
     items_qs = items_qs.order_by("-available_quantity", "title")
-    paginator = Paginator(items_qs, 50)
+    paginator = _CachedCountPaginator(items_qs, 50, cache_key=_ml_items_count_cache_key(search_query))
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     items = page_obj.object_list
@@ -322,22 +360,23 @@ def mercadolibre_dashboard(request):
                     available, user_product_id = ml.resolve_authoritative_stock(
                         connection, item, access_token
                     )
-                    existing = MercadoLibreItem.objects.filter(item_id=item_id).first()
-                    product = existing.product if existing else None
-                    matched_name = existing.matched_name if existing else ""
-                    MercadoLibreItem.objects.update_or_create(
-                        item_id=item_id,
-                        defaults={
-                            "title": title,
-                            "available_quantity": available,
-                            "status": status,
-                            "logistic_type": logistic_type,
-                            "user_product_id": user_product_id,
-                            "permalink": permalink,
-                            "product": product,
-                            "matched_name": matched_name,
-                        },
+                    # Un solo UPDATE que conserva product/matched_name; si no existía, se crea.
+                    fields = {
+                        "title": title,
+                        "available_quantity": available,
+                        "status": status,
+                        "logistic_type": logistic_type,
+                        "user_product_id": user_product_id,
+                        "permalink": permalink,
+                    }
+                    updated = MercadoLibreItem.objects.filter(item_id=item_id).update(
+                        last_synced=timezone.now(), **fields
                     )
+                    if updated:
+                        # update() no dispara señales y el título cambia el conteo filtrado.
+                        _invalidate_ml_items_count()
+                    else:
+                        MercadoLibreItem.objects.create(item_id=item_id, **fields)
                     messages.success(request, "Publicación sincronizada.")
                 except HTTPError as exc:
                     if exc.code == 401:
@@ -359,24 +398,21 @@ def mercadolibre_dashboard(request):
         elif action == "link_item":
             item_id = request.POST.get("item_id")
             product_id = request.POST.get("product_id")
-            ml_item = MercadoLibreItem.objects.filter(id=item_id).first()
-            if not ml_item:
-                messages.error(request, "No se encontró la publicación.")
-            else:
-                if product_id:
-                    product = Product.objects.filter(id=product_id).first()
-                    if not product:
-                        messages.error(request, "Producto no encontrado.")
-                    else:
-                        ml_item.product = product
-                        ml_item.matched_name = product.name
-                        ml_item.save(update_fields=["product", "matched_name"])
-                        messages.success(request, "Match actualizado.")
+            # Un UPDATE directo sobre la publicación: no hace falta cargarla para
+            # cambiar el vínculo (MercadoLibreItem no está auditado).
+            ml_items = MercadoLibreItem.objects.filter(id=item_id)
+            if product_id:
+                product_name = Product.objects.filter(id=product_id).values_list("name", flat=True).first()
+                if product_name is None:
+                    messages.error(request, "Producto no encontrado.")
+                elif ml_items.update(product_id=product_id, matched_name=product_name):
+                    messages.success(request, "Match actualizado.")
                 else:
-                    ml_item.product = None
-                    ml_item.matched_name = ""
-                    ml_item.save(update_fields=["product", "matched_name"])
-                    messages.success(request, "Match eliminado.")
+                    messages.error(request, "No se encontró la publicación.")
+            elif ml_items.update(product=None, matched_name=""):
+                messages.success(request, "Match eliminado.")
+            else:
+                messages.error(request, "No se encontró la publicación.")
         elif action == "delete_duplicate_sales":
             ids_to_delete = request.POST.getlist("delete_ids")
             if ids_to_delete:
@@ -655,7 +691,8 @@ def mercadolibre_dashboard(request):
         item.calc_min = eff_min
         item.calc_buffer = buf
 
-    products = Product.objects.order_by("name")
+    # Para el datalist de vinculación alcanza con id, nombre y marca.
+    products = Product.objects.order_by("name").only("id", "name", "group")
     recent_cutoff = timezone.now() - timedelta(days=30)
     sync_age_minutes = None
     if connection and connection.last_sync_at:
@@ -788,16 +825,21 @@ def mercadolibre_messages(request, order_id):
 def mercadolibre_webhook(request):
     if request.method == "GET":
         return HttpResponse("OK")
+    # El cuerpo se decodifica una sola vez para guardarlo crudo; orjson parsea los bytes.
+    try:
+        body = request.body.decode("utf-8")
+    except UnicodeDecodeError:
+        return HttpResponse("Invalid encoding", status=400)
     try:
-        payload = json.loads(request.body.decode("utf-8") or "{}")
-    except json.JSONDecodeError:
+        payload = orjson.loads(request.body or b"{}")
+    except orjson.JSONDecodeError:
         return HttpResponse("Invalid JSON", status=400)
     notification = MercadoLibreNotification.objects.create(
         topic=payload.get("topic", "") or "",
         resource=payload.get("resource", "") or "",
         ml_user_id=str(payload.get("user_id", "") or ""),
         application_id=str(payload.get("application_id", "") or ""),
-        raw_payload=request.body.decode("utf-8"),
+        raw_payload=body,
     )
     try:
         if notification.topic in {"orders_v2", "orders"}:
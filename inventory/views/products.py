@@ -3,6 +3,8 @@ from decimal import Decimal
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Q
 from django.db.models.deletion import ProtectedError
@@ -17,11 +19,17 @@ from ..models import (
     KitComponent,
     Product,
     ProductVariant,
+    Supplier,
     SupplierProduct,
     Warehouse,
 )
 from .. import services
+from ..signals import _bulk_audit
 from .common import (
+    PRODUCT_SEARCH_CACHE_TIMEOUT,
+    _invalidate_product_caches,
+    _product_group_options,
+    _product_search_cache_key,
     _products_with_last_cost_queryset,
     _product_label_with_last_cost,
 )
@@ -35,6 +43,7 @@ from .forms import (
 from .utils_xlsx import (
     _build_xlsx,
     _decimal_or_zero,
+    _max_sku_suffix,
     _parse_decimal,
     _process_costs_xlsx,
     _read_costs_xlsx_rows,
@@ -50,13 +59,7 @@ def create_product(request):
             product = form.save(commit=False)
             if not product.sku:
                 prefix = _sku_prefix(product.group or "", product.name or "")
-                existing = Product.objects.filter(sku__startswith=prefix).values_list("sku", flat=True)
-                max_suffix = 0
-                for sku in existing:
-                    suffix = sku[len(prefix):]
-                    if suffix.isdigit():
-                        max_suffix = max(max_suffix, int(suffix))
-                product.sku = f"{prefix}{max_suffix + 1:04d}"
+                product.sku = f"{prefix}{_max_sku_suffix(prefix) + 1:04d}"
             product.save()
             messages.success(request, "Producto creado.")
             return redirect("inventory_dashboard")
@@ -74,13 +77,7 @@ def edit_product(request, pk: int):
             product = form.save(commit=False)
             if not product.sku:
                 prefix = _sku_prefix(product.group or "", product.name or "")
-                existing = Product.objects.filter(sku__startswith=prefix).values_list("sku", flat=True)
-                max_suffix = 0
-                for sku in existing:
-                    suffix = sku[len(prefix):]
-                    if suffix.isdigit():
-                        max_suffix = max(max_suffix, int(suffix))
-                product.sku = f"{prefix}{max_suffix + 1:04d}"
+                product.sku = f"{prefix}{_max_sku_suffix(prefix) + 1:04d}"
             product.save()
             messages.success(request, "Producto actualizado.")
             return redirect("inventory_product_prices")
@@ -247,13 +244,7 @@ def product_prices(request):
                     "quantity": f"{(comp.quantity or Decimal('0.00')):.2f}",
                 }
             )
-    group_options = (
-        Product.objects.exclude(group="")
-        .exclude(group__isnull=True)
-        .values_list("group", flat=True)
-        .distinct()
-        .order_by("group")
-    )
+    group_options = _product_group_options()
     return render(
         request,
         "inventory/product_prices.html",
@@ -329,52 +320,78 @@ def product_margins(request):
     return render(request, "inventory/product_margins.html", {"products": products, "brands": brands})
 
 
+def _product_costs_queryset():
+    """Listado de la grilla de costos: solo las columnas que muestra cada fila."""
+    return Product.objects.only(
+        "id",
+        "sku",
+        "name",
+        "group",
+        "default_supplier_id",
+        "avg_cost",
+        "vat_percent",
+        "margin_consumer",
+        "margin_barber",
+        "margin_distributor",
+    ).order_by("sku", "pk")
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def product_costs(request):
     ProductCostFormSet = formset_factory(ProductCostRowForm, extra=0)
-    products_qs = Product.objects.select_related("default_supplier").order_by("sku")
-    products = list(products_qs)
-    group_options = (
-        Product.objects.exclude(group="")
-        .exclude(group__isnull=True)
-        .values_list("group", flat=True)
-        .distinct()
-        .order_by("group")
-    )
-    product_map = {product.id: product for product in products}
     product_form = ProductForm()
     bulk_form = ProductBulkUpdateForm()
-    initial = [
-        {
-            "product_id": product.id,
-            "name": product.name,
-            "group": product.group,
-            "supplier": product.default_supplier,
-            "avg_cost": product.avg_cost,
-            "vat_percent": product.vat_percent,
-            "margin_consumer": product.margin_consumer,
-            "margin_barber": product.margin_barber,
-            "margin_distributor": product.margin_distributor,
-        }
-        for product in products
-    ]
-    formset = ProductCostFormSet(initial=initial)
+    formset = None
     if request.method == "POST":
         action = request.POST.get("action", "update_costs")
+        is_ajax = (
+            request.headers.get("x-requested-with") == "XMLHttpRequest"
+            or request.headers.get("HX-Request") == "true"
+        )
+
+        def respond(msg: str, *, ok: bool = True, status: int = 200):
+            # Para AJAX/HTMX alcanza con un JSON; el resto vuelve a la página con mensaje.
+            if is_ajax:
+                return JsonResponse({"ok": ok, "msg": msg}, status=status)
+            (messages.success if ok else messages.error)(request, msg)
+            return redirect("inventory_product_costs")
+
+        if action == "quick_update_cost":
+            product_id = request.POST.get("product_id")
+            if not product_id:
+                return JsonResponse({"ok": False, "error": "missing_product_id"}, status=400)
+            product = Product.objects.filter(id=product_id).first()
+            if not product:
+                return JsonResponse({"ok": False, "error": "product_not_found"}, status=404)
+            # Costo e IVA no se editan acá: se cargan en Proveedores y se reflejan
+            # desde el proveedor principal. Solo se guardan los márgenes.
+            update_fields = []
+            if "margin_consumer" in request.POST:
+                margin_consumer = _parse_decimal(request.POST.get("margin_consumer"))
+                if product.margin_consumer != margin_consumer:
+                    product.margin_consumer = margin_consumer
+                    update_fields.append("margin_consumer")
+            if "margin_barber" in request.POST:
+                margin_barber = _parse_decimal(request.POST.get("margin_barber"))
+                if product.margin_barber != margin_barber:
+                    product.margin_barber = margin_barber
+                    update_fields.append("margin_barber")
+            if "margin_distributor" in request.POST:
+                margin_distributor = _parse_decimal(request.POST.get("margin_distributor"))
+                if product.margin_distributor != margin_distributor:
+                    product.margin_distributor = margin_distributor
+                    update_fields.append("margin_distributor")
+            if update_fields:
+                product.save(update_fields=update_fields)
+            return JsonResponse({"ok": True})
         if action == "create_product":
             product_form = ProductForm(request.POST)
             if product_form.is_valid():
                 product = product_form.save(commit=False)
                 if not product.sku:
                     prefix = _sku_prefix(product.group or "", product.name or "")
-                    existing = Product.objects.filter(sku__startswith=prefix).values_list("sku", flat=True)
-                    max_suffix = 0
-                    for sku in existing:
-                        suffix = sku[len(prefix):]
-                        if suffix.isdigit():
-                            max_suffix = max(max_suffix, int(suffix))
-                    product.sku = f"{prefix}{max_suffix + 1:04d}"
+                    product.sku = f"{prefix}{_max_sku_suffix(prefix) + 1:04d}"
                 product.save()
                 messages.success(request, "Producto creado.")
                 return redirect("inventory_product_costs")
@@ -396,37 +413,36 @@ def product_costs(request):
             margin_distributor = parse_optional_decimal(request.POST.get("margin_distributor"))
             group = (request.POST.get("group") or "").strip()
             if margin_consumer is None and margin_barber is None and margin_distributor is None:
-                messages.error(request, "Completá al menos un margen para aplicar cambios.")
-                return redirect("inventory_product_costs")
+                return respond("Completá al menos un margen para aplicar cambios.", ok=False, status=400)
 
             target_qs = Product.objects.order_by("sku")
             if group:
                 target_qs = target_qs.filter(group__iexact=group)
-            target_products = list(target_qs)
-            if not target_products:
-                messages.error(request, "No se encontraron productos para aplicar los cambios.")
-                return redirect("inventory_product_costs")
+            # Se bloquean las filas una vez y se confirma todo junto: otro admin
+            # no ve el catálogo a medio actualizar.
+            with transaction.atomic():
+                target_products = list(target_qs.select_for_update(of=("self",)))
+                if not target_products:
+                    return respond("No se encontraron productos para aplicar los cambios.", ok=False, status=404)
 
-            updated = 0
-            for product in target_products:
-                update_fields = []
-                if margin_consumer is not None:
-                    product.margin_consumer = margin_consumer
-                    update_fields.append("margin_consumer")
-                if margin_barber is not None:
-                    product.margin_barber = margin_barber
-                    update_fields.append("margin_barber")
-                if margin_distributor is not None:
-                    product.margin_distributor = margin_distributor
-                    update_fields.append("margin_distributor")
-                if update_fields:
-                    product.save(update_fields=update_fields)
-                    updated += 1
+                updated = 0
+                for product in target_products:
+                    update_fields = []
+                    if margin_consumer is not None:
+                        product.margin_consumer = margin_consumer
+                        update_fields.append("margin_consumer")
+                    if margin_barber is not None:
+                        product.margin_barber = margin_barber
+                        update_fields.append("margin_barber")
+                    if margin_distributor is not None:
+                        product.margin_distributor = margin_distributor
+                        update_fields.append("margin_distributor")
+                    if update_fields:
+                        product.save(update_fields=update_fields)
+                        updated += 1
             if group:
-                messages.success(request, f"Márgenes actualizados en {updated} productos de la marca/grupo '{group}'.")
-            else:
-                messages.success(request, f"Márgenes actualizados en {updated} productos.")
-            return redirect("inventory_product_costs")
+                return respond(f"Márgenes actualizados en {updated} productos de la marca/grupo '{group}'.")
+            return respond(f"Márgenes actualizados en {updated} productos.")
         elif action == "import_costs":
             upload = request.FILES.get("file")
             if not upload:
@@ -503,34 +519,6 @@ def product_costs(request):
                     "No se puede eliminar el producto porque está usado en ventas o movimientos. Podés desactivarlo retirando stock o duplicarlo.",
                 )
             return redirect("inventory_product_costs")
-        elif action == "quick_update_cost":
-            product_id = request.POST.get("product_id")
-            if not product_id:
-                return JsonResponse({"ok": False, "error": "missing_product_id"}, status=400)
-            product = Product.objects.filter(id=product_id).first()
-            if not product:
-                return JsonResponse({"ok": False, "error": "product_not_found"}, status=404)
-            # Costo e IVA no se editan acá: se cargan en Proveedores y se reflejan
-            # desde el proveedor principal. Solo se guardan los márgenes.
-            update_fields = []
-            if "margin_consumer" in request.POST:
-                margin_consumer = _parse_decimal(request.POST.get("margin_consumer"))
-                if product.margin_consumer != margin_consumer:
-                    product.margin_consumer = margin_consumer
-                    update_fields.append("margin_consumer")
-            if "margin_barber" in request.POST:
-                margin_barber = _parse_decimal(request.POST.get("margin_barber"))
-                if product.margin_barber != margin_barber:
-                    product.margin_barber = margin_barber
-                    update_fields.append("margin_barber")
-            if "margin_distributor" in request.POST:
-                margin_distributor = _parse_decimal(request.POST.get("margin_distributor"))
-                if product.margin_distributor != margin_distributor:
-                    product.margin_distributor = margin_distributor
-                    update_fields.append("margin_distributor")
-            if update_fields:
-                product.save(update_fields=update_fields)
-            return JsonResponse({"ok": True})
         elif action == "bulk_update":
             bulk_form = ProductBulkUpdateForm(request.POST)
             if bulk_form.is_valid():
@@ -548,132 +536,183 @@ def product_costs(request):
                     and margin_barber is None
                     and margin_distributor is None
                 ):
+                    if is_ajax:
+                        return respond("Completá al menos un campo para aplicar cambios.", ok=False, status=400)
                     messages.error(request, "Completá al menos un campo para aplicar cambios.")
                 else:
                     target_qs = Product.objects.select_related("default_supplier").order_by("sku")
                     if group:
                         target_qs = target_qs.filter(group__iexact=group)
 
-                    target_products = list(target_qs)
-                    if not target_products:
-                        messages.error(request, "No se encontraron productos para aplicar los cambios.")
-                        return redirect("inventory_product_costs")
+                    with transaction.atomic():
+                        target_products = list(target_qs.select_for_update(of=("self",)))
+                        if not target_products:
+                            return respond("No se encontraron productos para aplicar los cambios.", ok=False, status=404)
 
-                    updated = 0
-                    for product in target_products:
-                        update_fields = []
-                        if group and product.group != group:
-                            product.group = group
-                            update_fields.append("group")
-                        if supplier and product.default_supplier_id != supplier.id:
-                            product.default_supplier = supplier
-                            update_fields.append("default_supplier")
+                        # El ajuste porcentual del costo va en un solo bulk_update; no pasa
+                        # por save(), así que se audita y se invalidan las búsquedas cacheadas.
                         if cost_percent is not None:
                             multiplier = Decimal("1.00") + (cost_percent / Decimal("100.00"))
-                            product.avg_cost = (product.avg_cost or Decimal("0.00")) * multiplier
-                            product.avg_cost = product.avg_cost.quantize(Decimal("0.01"))
-                            update_fields.append("avg_cost")
-                        if margin_consumer is not None:
-                            product.margin_consumer = margin_consumer
-                            update_fields.append("margin_consumer")
-                        if margin_barber is not None:
-                            product.margin_barber = margin_barber
-                            update_fields.append("margin_barber")
-                        if margin_distributor is not None:
-                            product.margin_distributor = margin_distributor
-                            update_fields.append("margin_distributor")
-                        if update_fields:
-                            product.save(update_fields=update_fields)
-                            updated += 1
-                        if supplier:
-                            SupplierProduct.objects.update_or_create(
-                                supplier=supplier,
-                                product=product,
-                                defaults={
-                                    "last_cost": product.avg_cost,
-                                    "last_purchase_at": timezone.now(),
-                                },
-                            )
-                    messages.success(request, f"Actualización masiva aplicada a {updated} productos.")
-                    return redirect("inventory_product_costs")
+                            cost_changes = []
+                            for product in target_products:
+                                before = product.avg_cost
+                                product.avg_cost = ((before or Decimal("0.00")) * multiplier).quantize(Decimal("0.01"))
+                                cost_changes.append((product, {"avg_cost": (before, product.avg_cost)}))
+                            Product.objects.bulk_update(target_products, ["avg_cost"], batch_size=500)
+                            _bulk_audit(Product, updated=cost_changes)
+                            _invalidate_product_caches()
+
+                        updated = 0
+                        for product in target_products:
+                            update_fields = []
+                            if group and product.group != group:
+                                product.group = group
+                                update_fields.append("group")
+                            if supplier and product.default_supplier_id != supplier.id:
+                                product.default_supplier = supplier
+                                update_fields.append("default_supplier")
+                            if margin_consumer is not None:
+                                product.margin_consumer = margin_consumer
+                                update_fields.append("margin_consumer")
+                            if margin_barber is not None:
+                                product.margin_barber = margin_barber
+                                update_fields.append("margin_barber")
+                            if margin_distributor is not None:
+                                product.margin_distributor = margin_distributor
+                                update_fields.append("margin_distributor")
+                            if update_fields:
+                                product.save(update_fields=update_fields)
+                            if update_fields or cost_percent is not None:
+                                updated += 1
+                            if supplier:
+                                SupplierProduct.objects.update_or_create(
+                                    supplier=supplier,
+                                    product=product,
+                                    defaults={
+                                        "last_cost": product.avg_cost,
+                                        "last_purchase_at": timezone.now(),
+                                    },
+                                )
+                    return respond(f"Actualización masiva aplicada a {updated} productos.")
+            elif is_ajax:
+                error_list = []
+                for field_errors in bulk_form.errors.values():
+                    error_list.extend(field_errors)
+                return respond(" ".join(error_list) or "Revisá los datos de la actualización masiva.", ok=False, status=400)
         elif action == "update_cost_by_product":
             product_id = request.POST.get("product_id")
             avg_cost_raw = request.POST.get("avg_cost")
             if not product_id:
-                messages.error(request, "Seleccioná un producto.")
-                return redirect("inventory_product_costs")
+                return respond("Seleccioná un producto.", ok=False, status=400)
             product = Product.objects.filter(id=product_id).first()
             if not product:
-                messages.error(request, "Producto no encontrado.")
-                return redirect("inventory_product_costs")
+                return respond("Producto no encontrado.", ok=False, status=404)
             avg_cost = _parse_decimal(avg_cost_raw)
             product.avg_cost = avg_cost
             product.save(update_fields=["avg_cost"])
-            messages.success(request, "Costo actualizado.")
-            return redirect("inventory_product_costs")
+            return respond("Costo actualizado.")
         else:
             formset = ProductCostFormSet(request.POST)
             if formset.is_valid():
-                has_errors = False
-                for form in formset:
-                    product = product_map.get(form.cleaned_data["product_id"])
-                    if not product:
-                        continue
-                    name = (form.cleaned_data.get("name") or "").strip()
-                    group = (form.cleaned_data.get("group") or "").strip()
-                    if not name:
-                        form.add_error("name", "Nombre requerido.")
-                        has_errors = True
-                if has_errors:
-                    messages.error(request, "Revisá el SKU o nombre del producto.")
-                    return render(
-                        request,
-                        "inventory/cost_list.html",
-                        {"formset": formset, "product_form": product_form},
-                    )
+                with transaction.atomic():
+                    product_map = Product.objects.select_for_update().in_bulk([form.cleaned_data["product_id"] for form in formset])
+                    has_errors = False
+                    for form in formset:
+                        product = product_map.get(form.cleaned_data["product_id"])
+                        if not product:
+                            continue
+                        name = (form.cleaned_data.get("name") or "").strip()
+                        group = (form.cleaned_data.get("group") or "").strip()
+                        if not name:
+                            form.add_error("name", "Nombre requerido.")
+                            has_errors = True
+                    if has_errors:
+                        messages.error(request, "Revisá el SKU o nombre del producto.")
+                        return render(
+                            request,
+                            "inventory/cost_list.html",
+                            {"formset": formset, "product_form": product_form},
+                        )
 
-                for form in formset:
-                    product = product_map.get(form.cleaned_data["product_id"])
-                    if not product:
-                        continue
-                    # Costo e IVA NO se editan acá: salen del proveedor principal
-                    # (se cargan en Proveedores). Solo nombre, grupo, márgenes y
-                    # el proveedor principal.
-                    supplier = form.cleaned_data.get("supplier")
-                    name = form.cleaned_data.get("name") or product.name
-                    group = (form.cleaned_data.get("group") or "").strip()
-                    margin_consumer = form.cleaned_data.get("margin_consumer")
-                    margin_barber = form.cleaned_data.get("margin_barber")
-                    margin_distributor = form.cleaned_data.get("margin_distributor")
-                    update_fields = []
-                    if product.name != name:
-                        product.name = name
-                        update_fields.append("name")
-                    if product.group != group:
-                        product.group = group
-                        update_fields.append("group")
-                    if margin_consumer is not None and product.margin_consumer != margin_consumer:
-                        product.margin_consumer = margin_consumer
-                        update_fields.append("margin_consumer")
-                    if margin_barber is not None and product.margin_barber != margin_barber:
-                        product.margin_barber = margin_barber
-                        update_fields.append("margin_barber")
-                    if margin_distributor is not None and product.margin_distributor != margin_distributor:
-                        product.margin_distributor = margin_distributor
-                        update_fields.append("margin_distributor")
-                    supplier_changed = supplier and product.default_supplier_id != supplier.id
-                    if supplier_changed:
-                        product.default_supplier = supplier
-                        update_fields.append("default_supplier")
-                    if update_fields:
-                        product.save(update_fields=update_fields)
-                    # Si cambió el proveedor principal, el costo se toma de la lista
-                    # de ese proveedor (si la tiene).
-                    if supplier_changed:
-                        services.sync_product_cost_from_principal(product)
+                    for form in formset:
+                        product = product_map.get(form.cleaned_data["product_id"])
+                        if not product:
+                            continue
+                        # Costo e IVA NO se editan acá: salen del proveedor principal
+                        # (se cargan en Proveedores). Solo nombre, grupo, márgenes y
+                        # el proveedor principal.
+                        supplier = form.cleaned_data.get("supplier")
+                        name = form.cleaned_data.get("name") or product.name
+                        group = (form.cleaned_data.get("group") or "").strip()
+                        margin_consumer = form.cleaned_data.get("margin_consumer")
+                        margin_barber = form.cleaned_data.get("margin_barber")
+                        margin_distributor = form.cleaned_data.get("margin_distributor")
+                        update_fields = []
+                        if product.name != name:
+                            product.name = name
+                            update_fields.append("name")
+                        if product.group != group:
+                            product.group = group
+                            update_fields.append("group")
+                        if margin_consumer is not None and product.margin_consumer != margin_consumer:
+                            product.margin_consumer = margin_consumer
+                            update_fields.append("margin_consumer")
+                        if margin_barber is not None and product.margin_barber != margin_barber:
+                            product.margin_barber = margin_barber
+                            update_fields.append("margin_barber")
+                        if margin_distributor is not None and product.margin_distributor != margin_distributor:
+                            product.margin_distributor = margin_distributor
+                            update_fields.append("margin_distributor")
+                        supplier_changed = supplier and product.default_supplier_id != supplier.id
+                        if supplier_changed:
+                            product.default_supplier = supplier
+                            update_fields.append("default_supplier")
+                        if update_fields:
+                            product.save(update_fields=update_fields)
+                        # Si cambió el proveedor principal, el costo se toma de la lista
+                        # de ese proveedor (si la tiene).
+                        if supplier_changed:
+                            services.sync_product_cost_from_principal(product)
                 messages.success(request, "Márgenes y proveedor principal actualizados. El costo se edita en Proveedores.")
                 return redirect("inventory_product_costs")
             messages.error(request, "Revisá los costos ingresados.")
+
+    # Solo al renderizar la página se arma el listado, y de a una página. La
+    # búsqueda se resuelve en el servidor para alcanzar también las otras páginas.
+    search_query = (request.GET.get("q") or "").strip()
+    products_qs = _product_costs_queryset()
+    if search_query:
+        products_qs = products_qs.filter(
+            Q(sku__icontains=search_query)
+            | Q(name__icontains=search_query)
+            | Q(group__icontains=search_query)
+            | Q(default_supplier__name__icontains=search_query)
+        )
+    page_obj = Paginator(products_qs, 200).get_page(request.GET.get("page"))
+    products = list(page_obj.object_list)
+    if formset is None:
+        formset = ProductCostFormSet(
+            initial=[
+                {
+                    "product_id": product.id,
+                    "name": product.name,
+                    "group": product.group,
+                    "supplier": product.default_supplier_id,
+                    "avg_cost": product.avg_cost,
+                    "vat_percent": product.vat_percent,
+                    "margin_consumer": product.margin_consumer,
+                    "margin_barber": product.margin_barber,
+                    "margin_distributor": product.margin_distributor,
+                }
+                for product in products
+            ]
+        )
+    # Cada fila tiene su select de proveedor: las opciones se arman una sola vez
+    # en lugar de una consulta por fila al renderizar.
+    supplier_choices = [("", "---------"), *((s.pk, str(s)) for s in Supplier.objects.all())]
+    for form in formset:
+        form.fields["supplier"].choices = supplier_choices
+    group_options = _product_group_options()
     return render(
         request,
         "inventory/cost_list.html",
@@ -683,6 +722,8 @@ def product_costs(request):
             "bulk_form": bulk_form,
             "group_options": group_options,
             "products": products,
+            "page_obj": page_obj,
+            "search_query": search_query,
         },
     )
 
@@ -692,7 +733,12 @@ def product_info(request):
     product_id = request.GET.get("product_id")
     if not product_id:
         return JsonResponse({"ok": False, "error": "missing_product_id"}, status=400)
-    product = _products_with_last_cost_queryset().select_related("default_supplier").filter(id=product_id).first()
+    # Solo se traen las columnas que usa la respuesta (cost_with_vat mira is_kit).
+    product = (
+        Product.objects.only("id", "is_kit", "avg_cost", "vat_percent", "default_supplier_id")
+        .filter(id=product_id)
+        .first()
+    )
     if not product:
         return JsonResponse({"ok": False, "error": "product_not_found"}, status=404)
     data = {
@@ -719,21 +765,25 @@ def product_search(request):
     term = (request.GET.get("q") or "").strip()
     if not term:
         return JsonResponse({"ok": True, "results": []})
-    qs = _products_with_last_cost_queryset().filter(
-        Q(sku__icontains=term) | Q(name__icontains=term) | Q(group__icontains=term)
-    )
-    results = []
-    for product in qs.order_by("sku")[:20]:
-        results.append(
-            {
-                "id": product.id,
-                "label": _product_label_with_last_cost(product),
-                "default_supplier_id": product.default_supplier_id,
-                "avg_cost": f"{(product.avg_cost or Decimal('0.00')):.2f}",
-                "vat_percent": f"{(product.vat_percent or Decimal('0.00')):.2f}",
-                "cost_with_vat": f"{product.cost_with_vat():.2f}",
-            }
+    cache_key = _product_search_cache_key(term)
+    results = cache.get(cache_key)
+    if results is None:
+        qs = _products_with_last_cost_queryset().filter(
+            Q(sku__icontains=term) | Q(name__icontains=term) | Q(group__icontains=term)
         )
+        results = []
+        for product in qs.order_by("sku")[:20]:
+            results.append(
+                {
+                    "id": product.id,
+                    "label": _product_label_with_last_cost(product),
+                    "default_supplier_id": product.default_supplier_id,
+                    "avg_cost": f"{(product.avg_cost or Decimal('0.00')):.2f}",
+                    "vat_percent": f"{(product.vat_percent or Decimal('0.00')):.2f}",
+                    "cost_with_vat": f"{product.cost_with_vat():.2f}",
+                }
+            )
+        cache.set(cache_key, results, PRODUCT_SEARCH_CACHE_TIMEOUT)
     return JsonResponse({"ok": True, "results": results})
 
 
@@ -755,7 +805,13 @@ def product_prices_download(request, audience: str):
         return redirect("inventory_product_prices")
 
     attr = price_attr_map[audience]
-    rows = [[p.group or "", p.name, getattr(p, attr)] for p in products]
+    # El precio es una propiedad del modelo (precio fijo o costo con IVA + margen):
+    # se traen solo las columnas que la calculan, no la fila entera.
+    products = products.only(
+        "group", "name", "is_kit", "avg_cost", "vat_percent", f"price_{audience}", f"margin_{audience}"
+    )
+    # Las filas se generan a medida que _build_xlsx las escribe; no se arma la lista entera.
+    rows = ((p.group or "", p.name, getattr(p, attr)) for p in products.iterator(chunk_size=2000))
     xlsx_bytes = _build_xlsx(headers, rows, blue_cols={1}, number_cols={3})
     audience_label_map = {
         "consumer": "consumidor",
@@ -795,62 +851,99 @@ def import_products(request):
             return redirect("inventory_import_products")
 
         import csv
+        import io
 
+        # El CSV se decodifica de a bloques mientras se lee, sin cargarlo
+        # entero ni partirlo en una lista de líneas.
+        reader = csv.DictReader(io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""))
         try:
-            decoded = upload.read().decode("utf-8-sig").splitlines()
-            reader = csv.DictReader(decoded)
+            fieldnames = reader.fieldnames or []
         except Exception:
             messages.error(request, "No se pudo leer el CSV. Verificá el formato.")
             return redirect("inventory_import_products")
 
         required_cols = ["sku", "nombre", "costo unitario"]
-        normalized_fieldnames = [name.strip().lower() for name in (reader.fieldnames or [])]
+        normalized_fieldnames = [name.strip().lower() for name in fieldnames]
         missing = [col for col in required_cols if col not in normalized_fieldnames]
         if missing:
             messages.error(request, f"Faltan columnas obligatorias: {', '.join(missing)}")
             return redirect("inventory_import_products")
 
+        rows = []
+        try:
+            for row in reader:
+                data = {k.strip().lower(): (v or "").strip() for k, v in row.items()}
+                if data.get("sku"):
+                    rows.append(data)
+        except (UnicodeDecodeError, csv.Error):
+            messages.error(request, "No se pudo leer el CSV. Verificá el formato.")
+            return redirect("inventory_import_products")
+
+        # Un solo SELECT para los SKU existentes y escrituras en lote al final.
+        existing = Product.objects.in_bulk({data["sku"] for data in rows}, field_name="sku")
+        import_fields = [
+            "name",
+            "group",
+            "avg_cost",
+            "vat_percent",
+            "margin_consumer",
+            "margin_barber",
+            "margin_distributor",
+        ]
+        new_products: dict[str, Product] = {}
+        to_update: dict[str, Product] = {}
+        # Valores previos de cada producto existente, para el AuditLog.
+        old_values: dict[str, dict] = {}
         created = 0
         updated = 0
-        for row in reader:
-            data = {k.strip().lower(): (v or "").strip() for k, v in row.items()}
-            sku = data.get("sku")
-            if not sku:
-                continue
-            product, was_created = Product.objects.get_or_create(
-                sku=sku,
-                defaults={
-                    "name": data.get("nombre", ""),
-                    "group": data.get("grupo", ""),
-                    "avg_cost": _decimal_or_zero(data.get("costo unitario")),
-                    "vat_percent": _decimal_or_zero(data.get("iva")),
-                    "margin_consumer": _decimal_or_zero(data.get("margen consumidor")),
-                    "margin_barber": _decimal_or_zero(data.get("margen barber")),
-                    "margin_distributor": _decimal_or_zero(data.get("margen distribuidor")),
-                },
-            )
-            if not was_created:
-                product.name = data.get("nombre", product.name)
-                product.group = data.get("grupo", product.group)
-                product.avg_cost = _decimal_or_zero(data.get("costo unitario"))
-                product.vat_percent = _decimal_or_zero(data.get("iva"))
-                product.margin_consumer = _decimal_or_zero(data.get("margen consumidor"))
-                product.margin_barber = _decimal_or_zero(data.get("margen barber"))
-                product.margin_distributor = _decimal_or_zero(data.get("margen distribuidor"))
-                product.save(
-                    update_fields=[
-                        "name",
-                        "group",
-                        "avg_cost",
-                        "vat_percent",
-                        "margin_consumer",
-                        "margin_barber",
-                        "margin_distributor",
-                    ]
+        for data in rows:
+            sku = data["sku"]
+            product = existing.get(sku) or new_products.get(sku)
+            if product is None:
+                new_products[sku] = Product(
+                    sku=sku,
+                    name=data.get("nombre", ""),
+                    group=data.get("grupo", ""),
+                    avg_cost=_decimal_or_zero(data.get("costo unitario")),
+                    vat_percent=_decimal_or_zero(data.get("iva")),
+                    margin_consumer=_decimal_or_zero(data.get("margen consumidor")),
+                    margin_barber=_decimal_or_zero(data.get("margen barber")),
+                    margin_distributor=_decimal_or_zero(data.get("margen distribuidor")),
                 )
-                updated += 1
-            else:
                 created += 1
+                continue
+            if sku in existing and sku not in old_values:
+                old_values[sku] = {field: getattr(product, field) for field in import_fields}
+            product.name = data.get("nombre", product.name)
+            product.group = data.get("grupo", product.group)
+            product.avg_cost = _decimal_or_zero(data.get("costo unitario"))
+            product.vat_percent = _decimal_or_zero(data.get("iva"))
+            product.margin_consumer = _decimal_or_zero(data.get("margen consumidor"))
+            product.margin_barber = _decimal_or_zero(data.get("margen barber"))
+            product.margin_distributor = _decimal_or_zero(data.get("margen distribuidor"))
+            if sku in existing:
+                to_update[sku] = product
+            updated += 1
+
+        # bulk_create/bulk_update no pasan por las señales de auditoría: el
+        # AuditLog se escribe en la misma transacción.
+        with transaction.atomic():
+            Product.objects.bulk_create(list(new_products.values()), batch_size=1000)
+            Product.objects.bulk_update(list(to_update.values()), import_fields, batch_size=500)
+            _bulk_audit(
+                Product,
+                created=new_products.values(),
+                updated=[
+                    (
+                        product,
+                        {field: (old_values[sku][field], getattr(product, field)) for field in import_fields},
+                    )
+                    for sku, product in to_update.items()
+                ],
+            )
+        # Las escrituras en lote no disparan las señales de Product.
+        if new_products or to_update:
+            _invalidate_product_caches()
 
         messages.success(request, f"Importación completa. Nuevos: {created}, Actualizados: {updated}.")
         return redirect("inventory_product_prices")
@@ -917,12 +1010,7 @@ def import_costs_xlsx(request):
         messages.success(request, msg)
         return redirect("inventory_product_prices")
 
-    group_options = (
-        Product.objects.exclude(group="")
-        .order_by("group")
-        .values_list("group", flat=True)
-        .distinct()
-    )
+    group_options = _product_group_options()
     return render(
         request,
         "inventory/cost_import.html",
@@ -1,6 +1,8 @@
 """Supplier views."""
 from datetime import datetime, time
 from decimal import Decimal
+import heapq
+from operator import itemgetter
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -650,8 +652,8 @@ def suppliers(request):
         if balance > 0:
             debtors.append({"supplier": supplier, "balance": balance})
             total_debt += balance
-    debtors.sort(key=lambda item: item["balance"], reverse=True)
-    debtors = debtors[:8]
+    # Solo se muestran los 8 mayores: selección parcial en lugar de ordenar todo.
+    debtors = heapq.nlargest(8, debtors, key=itemgetter("balance"))
     context["supplier_rows"] = supplier_rows
     context["period_start"] = period_start
     context["period_end"] = period_end
@@ -2,10 +2,109 @@
 from decimal import Decimal
 import io
 import re
+import shutil
+import tempfile
 import unicodedata
 import zipfile
-
-from xml.sax.saxutils import escape
+from collections.abc import Iterable, Iterator, Sequence
+
+from django.db import transaction
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast, Lower, Substr
+from lxml import etree
+
+# Hasta este tamaño el cuerpo de la hoja queda en memoria; más grande va a disco.
+_SHEET_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Patrones de los loops de importación, compilados una sola vez.
+_RE_NON_NUMERIC = re.compile(r"[^0-9.\-]")
+_RE_NON_ALNUM = re.compile(r"[^A-Za-z0-9]")
+_RE_WHITESPACE = re.compile(r"\s+")
+# Caracteres de control que XML 1.0 no admite; lxml rechaza el texto que los trae.
+_RE_XML_INVALID = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_DEC_ZERO = Decimal("0.00")
+_DEC_QUANT = Decimal("0.01")
+
+
+# Partes fijas del paquete XLSX: ya en bytes, se escriben tal cual en cada export.
+_XLSX_CONTENT_TYPES = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    b'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    b'<Default Extension="xml" ContentType="application/xml"/>'
+    b'<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    b'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    b'<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    b'<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+    b'<Override PartName="/docProps/app.xml" ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>'
+    b"</Types>"
+)
+_XLSX_ROOT_RELS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    b'<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    b'<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>'
+    b'<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/extended-properties" Target="docProps/app.xml"/>'
+    b"</Relationships>"
+)
+_XLSX_CORE_PROPS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+    b'xmlns:dc="http://purl.org/dc/elements/1.1/" '
+    b'xmlns:dcterms="http://purl.org/dc/terms/" '
+    b'xmlns:dcmitype="http://purl.org/dc/dcmitype/" '
+    b'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+    b"<dc:title>Precios</dc:title>"
+    b"</cp:coreProperties>"
+)
+_XLSX_APP_PROPS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties" '
+    b'xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes">'
+    b"<Application>Django</Application>"
+    b"</Properties>"
+)
+_XLSX_WORKBOOK_RELS = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    b'<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    b'<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    b"</Relationships>"
+)
+_XLSX_WORKBOOK = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    b'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    b'<sheets><sheet name="Precios" sheetId="1" r:id="rId1"/></sheets>'
+    b"</workbook>"
+)
+_XLSX_STYLES = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    b'<fonts count="3">'
+    b'<font><sz val="11"/><color theme="1"/><name val="Calibri"/></font>'
+    b'<font><b/><sz val="11"/><color theme="1"/><name val="Calibri"/></font>'
+    b'<font><sz val="11"/><color rgb="FF1F4EAD"/><name val="Calibri"/></font>'
+    b"</fonts>"
+    b'<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    b'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    b'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    b'<cellXfs count="4">'
+    b'<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    b'<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    b'<xf numFmtId="0" fontId="2" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    b'<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    b"</cellXfs>"
+    b'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    b"</styleSheet>"
+)
+_XLSX_SHEET_OPEN = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    b' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+)
+_XLSX_SHEET_CLOSE = b"</worksheet>"
 
 
 def _col_letter(idx: int) -> str:
@@ -18,196 +117,258 @@ def _col_letter(idx: int) -> str:
 
 def _build_xlsx(
     headers: list[str],
-    rows: list[list[str | Decimal]],
+    rows: Iterable[Sequence[str | Decimal]],
     *,
     blue_cols: set[int] | None = None,
     number_cols: set[int] | None = None,
 ) -> bytes:
     buf = io.BytesIO()
     with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        # Root relations
-        zf.writestr(
-            "[Content_Types].xml",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
-            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
-            '<Default Extension="xml" ContentType="application/xml"/>'
-            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
-            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
-            '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
-            '<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
-            '<Override PartName="/docProps/app.xml" ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>'
-            "</Types>",
-        )
-        zf.writestr(
-            "_rels/.rels",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
-            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
-            '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>'
-            '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/extended-properties" Target="docProps/app.xml"/>'
-            "</Relationships>",
-        )
-        zf.writestr(
-            "docProps/core.xml",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
-            'xmlns:dc="http://purl.org/dc/elements/1.1/" '
-            'xmlns:dcterms="http://purl.org/dc/terms/" '
-            'xmlns:dcmitype="http://purl.org/dc/dcmitype/" '
-            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
-            "<dc:title>Precios</dc:title>"
-            "</cp:coreProperties>",
-        )
-        zf.writestr(
-            "docProps/app.xml",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties" '
-            'xmlns:vt="http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes">'
-            "<Application>Django</Application>"
-            "</Properties>",
-        )
-        zf.writestr(
-            "xl/_rels/workbook.xml.rels",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
-            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
-            '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
-            "</Relationships>",
-        )
-        zf.writestr(
-            "xl/workbook.xml",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
-            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
-            '<sheets><sheet name="Precios" sheetId="1" r:id="rId1"/></sheets>'
-            "</workbook>",
-        )
-        zf.writestr(
-            "xl/styles.xml",
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
-            '<fonts count="3">'
-            '<font><sz val="11"/><color theme="1"/><name val="Calibri"/></font>'
-            '<font><b/><sz val="11"/><color theme="1"/><name val="Calibri"/></font>'
-            '<font><sz val="11"/><color rgb="FF1F4EAD"/><name val="Calibri"/></font>'
-            "</fonts>"
-            '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
-            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
-            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
-            '<cellXfs count="4">'
-            '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
-            '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
-            '<xf numFmtId="0" fontId="2" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
-            '<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
-            "</cellXfs>"
-            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
-            "</styleSheet>",
-        )
+        zf.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        zf.writestr("docProps/core.xml", _XLSX_CORE_PROPS)
+        zf.writestr("docProps/app.xml", _XLSX_APP_PROPS)
+        zf.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        zf.writestr("xl/workbook.xml", _XLSX_WORKBOOK)
+        zf.writestr("xl/styles.xml", _XLSX_STYLES)
 
         cols = len(headers)
-        rows_count = len(rows) + 1  # header row
-        dimension = f"A1:{_col_letter(cols)}{rows_count}"
 
         blue_cols = blue_cols or set()
         number_cols = number_cols or set()
 
-        def cell_xml(value, col_idx, row_idx, is_header=False):
-            col = _col_letter(col_idx)
-            ref = f"{col}{row_idx}"
-            if is_header:
-                return f'<c r="{ref}" t="inlineStr" s="1"><is><t>{escape(str(value))}</t></is></c>'
-            if isinstance(value, str):
-                style = "2" if col_idx in blue_cols else "0"
-                return f'<c r="{ref}" t="inlineStr" s="{style}"><is><t>{escape(str(value))}</t></is></c>'
-            style = "3" if col_idx in number_cols else "0"
-            return f'<c r="{ref}" s="{style}"><v>{value}</v></c>'
-
+        # Letras y escritor de cada columna se resuelven una sola vez; en el
+        # loop de filas ya no se consulta blue_cols/number_cols por celda.
+        col_letters = [_col_letter(i + 1) for i in range(cols)]
+
+        def make_writer(letter, text_style, number_style, is_number):
+            def write(row_el, value, row_ref) -> int:
+                """Agrega la celda a la fila y devuelve el largo del texto que muestra."""
+                ref = letter + row_ref
+                if isinstance(value, str):
+                    value = _RE_XML_INVALID.sub("", value)
+                    c = etree.SubElement(row_el, "c", r=ref, t="inlineStr", s=text_style)
+                    etree.SubElement(etree.SubElement(c, "is"), "t").text = value
+                    return len(value)
+                text = str(value)
+                etree.SubElement(etree.SubElement(row_el, "c", r=ref, s=number_style), "v").text = text
+                if is_number and isinstance(value, Decimal):
+                    return len(f"{value:.2f}")
+                return len(text)
+
+            return write
+
+        def add_writers(width):
+            for i in range(len(writers), width):
+                writers.append(
+                    make_writer(
+                        _col_letter(i + 1),
+                        "2" if i + 1 in blue_cols else "0",
+                        "3" if i + 1 in number_cols else "0",
+                        i + 1 in number_cols,
+                    )
+                )
+
+        writers = []
+        add_writers(cols)
+
+        # Una sola pasada: cada celda se renderiza una vez y a la vez se mide
+        # el ancho de su columna. Como <cols> va antes de <sheetData>, las
+        # filas se acumulan en un spool (memoria y, si crece, disco) y se
+        # copian al zip al final. El serializado y el escapado de texto los
+        # hace lxml en C. rows puede ser un generador: se consume una vez y
+        # las filas y columnas se cuentan al pasar.
+        rows_count = 1  # header row
+        row_width = cols
         max_lengths = [len(str(h)) for h in headers]
-        for row in rows:
-            for idx, val in enumerate(row):
-                if idx >= len(max_lengths):
-                    continue
-                if isinstance(val, Decimal):
-                    text = f"{val:.2f}" if (idx + 1) in number_cols else str(val)
-                else:
-                    text = str(val)
-                if len(text) > max_lengths[idx]:
-                    max_lengths[idx] = len(text)
-        col_widths = []
-        for length in max_lengths:
-            col_widths.append(min(60, max(8, round(length * 1.1 + 2, 2))))
-
-        rows_xml = []
-        header_cells = "".join(cell_xml(h, i + 1, 1, is_header=True) for i, h in enumerate(headers))
-        rows_xml.append(f'<row r="1">{header_cells}</row>')
-        for ridx, row in enumerate(rows, start=2):
-            cells = "".join(cell_xml(val, cidx + 1, ridx) for cidx, val in enumerate(row))
-            rows_xml.append(f'<row r="{ridx}">{cells}</row>')
-
-        cols_xml = "".join(
-            f'<col min="{idx}" max="{idx}" width="{width}" customWidth="1"/>'
-            for idx, width in enumerate(col_widths, start=1)
-        )
-        sheet_xml = (
-            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-            f'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
-            f' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
-            f'<dimension ref="{dimension}"/>'
-            f"<cols>{cols_xml}</cols>"
-            "<sheetData>"
-            f'{"".join(rows_xml)}'
-            "</sheetData>"
-            "</worksheet>"
-        )
-        zf.writestr("xl/worksheets/sheet1.xml", sheet_xml)
+        with tempfile.SpooledTemporaryFile(max_size=_SHEET_SPOOL_MAX_SIZE) as body:
+            with etree.xmlfile(body, encoding="utf-8") as xf:
+                with xf.element("sheetData"):
+                    header_row = etree.Element("row", r="1")
+                    for letter, h in zip(col_letters, headers):
+                        c = etree.SubElement(header_row, "c", r=f"{letter}1", t="inlineStr", s="1")
+                        etree.SubElement(etree.SubElement(c, "is"), "t").text = _RE_XML_INVALID.sub("", str(h))
+                    xf.write(header_row)
+                    for ridx, row in enumerate(rows, start=2):
+                        rows_count = ridx
+                        if len(row) > row_width:
+                            row_width = len(row)
+                            add_writers(row_width)
+                        row_ref = str(ridx)
+                        row_el = etree.Element("row", r=row_ref)
+                        for idx, val in enumerate(row):
+                            text_len = writers[idx](row_el, val, row_ref)
+                            if idx < cols and text_len > max_lengths[idx]:
+                                max_lengths[idx] = text_len
+                        xf.write(row_el)
+
+            dimension = f"A1:{_col_letter(cols)}{rows_count}"
+            col_widths = [min(60, max(8, round(length * 1.1 + 2, 2))) for length in max_lengths]
+            cols_xml = "".join(
+                f'<col min="{idx}" max="{idx}" width="{width}" customWidth="1"/>'
+                for idx, width in enumerate(col_widths, start=1)
+            )
+            body.seek(0)
+            with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+                sheet.write(_XLSX_SHEET_OPEN)
+                sheet.write(f'<dimension ref="{dimension}"/><cols>{cols_xml}</cols>'.encode("utf-8"))
+                shutil.copyfileobj(body, sheet)
+                sheet.write(_XLSX_SHEET_CLOSE)
     return buf.getvalue()
 
 
 def _decimal_or_zero(value: str | None) -> Decimal:
     if value is None or str(value).strip() == "":
-        return Decimal("0.00")
+        return _DEC_ZERO
     try:
-        return Decimal(str(value)).quantize(Decimal("0.01"))
+        return Decimal(str(value)).quantize(_DEC_QUANT)
     except Exception:
-        return Decimal("0.00")
+        return _DEC_ZERO
 
 
 def _parse_decimal(value: str | None) -> Decimal:
     if value is None:
-        return Decimal("0.00")
-    if isinstance(value, (int, float, Decimal)):
-        return Decimal(str(value)).quantize(Decimal("0.01"))
+        return _DEC_ZERO
+    # openpyxl entrega int/float/Decimal tal cual; type() exacto evita además
+    # que un bool entre por la rama de int.
+    value_type = type(value)
+    if value_type is Decimal:
+        return value.quantize(_DEC_QUANT)
+    if value_type is int:
+        return Decimal(value).quantize(_DEC_QUANT)
+    if value_type is float:
+        return Decimal(repr(value)).quantize(_DEC_QUANT)
     cleaned = str(value).strip().replace(".", "").replace(",", ".")
-    cleaned = re.sub(r"[^0-9.\-]", "", cleaned)
+    cleaned = _RE_NON_NUMERIC.sub("", cleaned)
     if cleaned == "":
-        return Decimal("0.00")
+        return _DEC_ZERO
     try:
-        return Decimal(cleaned).quantize(Decimal("0.01"))
+        return Decimal(cleaned).quantize(_DEC_QUANT)
     except Exception:
-        return Decimal("0.00")
+        return _DEC_ZERO
 
 
 def _abbr(text: str | None, length: int) -> str:
     if not text:
         return "X" * length
-    cleaned = re.sub(r"[^A-Za-z0-9]", "", text).upper()
+    cleaned = _RE_NON_ALNUM.sub("", text).upper()
     return cleaned[:length].ljust(length, "X")
 
 
 def _sku_prefix(group: str, description: str) -> str:
-    words = [w for w in re.split(r"\s+", (description or "").strip()) if w]
+    words = [w for w in _RE_WHITESPACE.split((description or "").strip()) if w]
     word1 = _abbr(words[0], 3) if len(words) > 0 else "XXX"
     word2 = _abbr(words[1], 3) if len(words) > 1 else "XXX"
     return f"{_abbr(group, 4)}{word1}{word2}"
 
 
+def _max_sku_suffix(prefix: str) -> int:
+    """Mayor sufijo numérico de los SKU que empiezan con prefix (0 si no hay).
+
+    Se resuelve con un único MAX() en la base en lugar de traer todos los SKU;
+    el regex deja afuera los sufijos no numéricos antes del CAST.
+    """
+    from ..models import Product
+
+    result = (
+        Product.objects.filter(sku__startswith=prefix, sku__regex=rf"^{re.escape(prefix)}[0-9]+$")
+        .annotate(sku_suffix=Cast(Substr("sku", len(prefix) + 1), IntegerField()))
+        .aggregate(max_suffix=Max("sku_suffix"))
+    )
+    return result["max_suffix"] or 0
+
+
+def _max_sku_suffixes(prefixes: Iterable[str]) -> dict[str, int]:
+    """Como _max_sku_suffix, pero para varios prefijos en una sola consulta.
+
+    Todos los prefijos de _sku_prefix miden lo mismo (4+3+3), así que se
+    agrupa por los primeros caracteres del SKU y se toma el MAX del resto.
+    """
+    from ..models import Product
+
+    prefixes = list(prefixes)
+    counters = dict.fromkeys(prefixes, 0)
+    if not prefixes:
+        return counters
+    length = len(prefixes[0])
+    pattern = "^(" + "|".join(re.escape(prefix) for prefix in prefixes) + ")[0-9]+$"
+    rows = (
+        Product.objects.filter(sku__regex=pattern)
+        .annotate(
+            sku_prefix=Substr("sku", 1, length),
+            sku_suffix=Cast(Substr("sku", length + 1), IntegerField()),
+        )
+        .values("sku_prefix")
+        .annotate(max_suffix=Max("sku_suffix"))
+        .order_by()
+    )
+    for row in rows:
+        counters[row["sku_prefix"]] = row["max_suffix"] or 0
+    return counters
+
+
 def _normalize_header(value: str) -> str:
+    # Lo habitual son encabezados ASCII: no hay tildes que sacar.
+    if value.isascii():
+        return value.strip().lower()
     normalized = unicodedata.normalize("NFKD", value)
     without_accents = "".join(c for c in normalized if not unicodedata.combining(c))
     return without_accents.strip().lower()
 
 
+def _header_keys(*keys: str) -> tuple[str, ...]:
+    # Normaliza una vez y descarta las variantes que quedan iguales (con/sin tilde).
+    return tuple(dict.fromkeys(_normalize_header(key) for key in keys))
+
+
+def _pick_index(header_map: dict[str, int], keys: tuple[str, ...]) -> int | None:
+    for key in keys:
+        if key in header_map:
+            return header_map[key]
+    return None
+
+
+def _data_rows(ws, width: int) -> Iterator[tuple]:
+    # En read_only openpyxl corta cada fila en su última celda con dato;
+    # se rellena hasta el ancho del encabezado para indexar sin IndexError.
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        if len(row) < width:
+            row = row + (None,) * (width - len(row))
+        yield row
+
+
+# Encabezados aceptados por columna, ya normalizados.
+_COST_DESC_KEYS = _header_keys("descripcion", "descripción", "producto", "descripcion producto", "nombre")
+_COST_PRICE_KEYS = _header_keys(
+    "precio venta", "precio", "costo", "costo unitario", "precio costo", "precio venta unitario"
+)
+_COST_GROUP_KEYS = _header_keys("grupo", "marca", "categoria", "categoría")
+_COST_SKU_KEYS = _header_keys("sku", "codigo", "código", "cod", "codigo sku")
+
+_ML_DATE_KEYS = _header_keys("fecha", "fecha venta")
+_ML_ORDER_KEYS = _header_keys(
+    "comprobante",
+    "nro comprobante",
+    "número comprobante",
+    "numero comprobante",
+    "orden",
+    "nro orden",
+    "número orden",
+    "numero orden",
+    "pedido",
+    "nro pedido",
+    "número pedido",
+    "numero pedido",
+    "order id",
+    "id pedido",
+)
+_ML_PRODUCT_KEYS = _header_keys("producto", "publicacion", "publicación", "titulo", "título", "nombre")
+_ML_QTY_KEYS = _header_keys("cantidad", "cant")
+_ML_PRICE_TOTAL_KEYS = _header_keys("precio bruto venta", "precio bruto", "precio")
+_ML_COMMISSION_KEYS = _header_keys("comision", "comisión")
+_ML_TAX_KEYS = _header_keys("impuestos", "impuesto", "iibb")
+
+
 def _read_costs_xlsx_rows(upload) -> tuple[list[tuple[str, str, Decimal, str]], str | None]:
     try:
         from openpyxl import load_workbook
@@ -215,46 +376,38 @@ def _read_costs_xlsx_rows(upload) -> tuple[list[tuple[str, str, Decimal, str]],
         return [], "Falta la dependencia openpyxl. Instalá openpyxl en el entorno."
 
     try:
-        wb = load_workbook(upload, data_only=True)
-        ws = wb.active
+        # read_only: openpyxl recorre la hoja fila a fila sin cargarla entera.
+        wb = load_workbook(upload, read_only=True, data_only=True)
     except Exception:
         return [], "No se pudo leer el archivo XLSX."
 
-    headers = [
-        str(cell.value).strip() if cell.value is not None else ""
-        for cell in next(ws.iter_rows(min_row=1, max_row=1))
-    ]
-    header_map = {_normalize_header(h): idx for idx, h in enumerate(headers)}
-    desc_keys = ["descripcion", "descripción", "producto", "descripcion producto", "nombre"]
-    cost_keys = ["precio venta", "precio", "costo", "costo unitario", "precio costo", "precio venta unitario"]
-    group_keys = ["grupo", "marca", "categoria", "categoría"]
-    sku_keys = ["sku", "codigo", "código", "cod", "codigo sku"]
-
-    def _pick_index(keys: list[str]) -> int | None:
-        for key in keys:
-            normalized = _normalize_header(key)
-            if normalized in header_map:
-                return header_map[normalized]
-        return None
-
-    desc_idx = _pick_index(desc_keys)
-    cost_idx = _pick_index(cost_keys)
-    group_idx = _pick_index(group_keys)
-    sku_idx = _pick_index(sku_keys)
-
-    if desc_idx is None or cost_idx is None:
-        return [], "Faltan columnas obligatorias: Descripción/Producto y Precio/Costo."
-
-    rows: list[tuple[str, str, Decimal, str]] = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        group = str(row[group_idx] or "").strip() if group_idx is not None else ""
-        description = str(row[desc_idx] or "").strip()
-        cost = _parse_decimal(row[cost_idx])
-        sku = str(row[sku_idx] or "").strip() if sku_idx is not None else ""
-        if not description:
-            continue
-        rows.append((group, description, cost, sku))
-    return rows, None
+    try:
+        ws = wb.active
+        headers = [
+            str(value).strip() if value is not None else ""
+            for value in next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
+        ]
+        header_map = {_normalize_header(h): idx for idx, h in enumerate(headers)}
+        desc_idx = _pick_index(header_map, _COST_DESC_KEYS)
+        cost_idx = _pick_index(header_map, _COST_PRICE_KEYS)
+        group_idx = _pick_index(header_map, _COST_GROUP_KEYS)
+        sku_idx = _pick_index(header_map, _COST_SKU_KEYS)
+
+        if desc_idx is None or cost_idx is None:
+            return [], "Faltan columnas obligatorias: Descripción/Producto y Precio/Costo."
+
+        rows: list[tuple[str, str, Decimal, str]] = []
+        for row in _data_rows(ws, len(headers)):
+            group = str(row[group_idx] or "").strip() if group_idx is not None else ""
+            description = str(row[desc_idx] or "").strip()
+            cost = _parse_decimal(row[cost_idx])
+            sku = str(row[sku_idx] or "").strip() if sku_idx is not None else ""
+            if not description:
+                continue
+            rows.append((group, description, cost, sku))
+        return rows, None
+    finally:
+        wb.close()
 
 
 def _read_ml_sales_xlsx_rows(upload) -> tuple[list[dict], str | None]:
@@ -264,79 +417,56 @@ def _read_ml_sales_xlsx_rows(upload) -> tuple[list[dict], str | None]:
         return [], "Falta la dependencia openpyxl. Instalá openpyxl en el entorno."
 
     try:
-        wb = load_workbook(upload, data_only=True)
-        ws = wb.active
+        wb = load_workbook(upload, read_only=True, data_only=True)
     except Exception:
         return [], "No se pudo leer el archivo XLSX."
 
-    header_cells = next(ws.iter_rows(min_row=1, max_row=1))
-    headers = [
-        str(cell.value).strip() if cell.value is not None else ""
-        for cell in header_cells
-    ]
-    header_map = {_normalize_header(h): idx for idx, h in enumerate(headers)}
-
-    def _pick_index(keys: list[str]) -> int | None:
-        for key in keys:
-            normalized = _normalize_header(key)
-            if normalized in header_map:
-                return header_map[normalized]
-        return None
-
-    date_idx = _pick_index(["fecha", "fecha venta"])
-    order_idx = _pick_index(
-        [
-            "comprobante",
-            "nro comprobante",
-            "número comprobante",
-            "numero comprobante",
-            "orden",
-            "nro orden",
-            "número orden",
-            "numero orden",
-            "pedido",
-            "nro pedido",
-            "número pedido",
-            "numero pedido",
-            "order id",
-            "id pedido",
+    try:
+        ws = wb.active
+        headers = [
+            str(value).strip() if value is not None else ""
+            for value in next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
         ]
-    )
-    product_idx = _pick_index(["producto", "publicacion", "publicación", "titulo", "título", "nombre"])
-    qty_idx = _pick_index(["cantidad", "cant"])
-    price_total_idx = _pick_index(["precio bruto venta", "precio bruto", "precio"])
-    commission_idx = _pick_index(["comision", "comisión"])
-    tax_idx = _pick_index(["impuestos", "impuesto", "iibb"])
-
-    required = [date_idx, product_idx, qty_idx, price_total_idx, commission_idx, tax_idx]
-    if any(idx is None for idx in required):
-        return [], "Faltan columnas obligatorias: Fecha, Producto, Cantidad, Precio Bruto Venta, Comision, Impuestos."
-
-    rows: list[dict] = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        title = str(row[product_idx] or "").strip() if product_idx is not None else ""
-        if not title:
-            continue
-        qty = _parse_decimal(row[qty_idx])
-        if qty <= 0:
-            continue
-        price_total = _parse_decimal(row[price_total_idx])
-        commission = _parse_decimal(row[commission_idx])
-        taxes = _parse_decimal(row[tax_idx])
-        created_at = row[date_idx] if date_idx is not None else None
-        order_id = str(row[order_idx] or "").strip() if order_idx is not None else ""
-        rows.append(
-            {
-                "title": title,
-                "quantity": qty,
-                "price_total": price_total,
-                "commission": commission,
-                "taxes": taxes,
-                "created_at": created_at,
-                "order_id": order_id,
-            }
-        )
-    return rows, None
+        header_map = {_normalize_header(h): idx for idx, h in enumerate(headers)}
+        date_idx = _pick_index(header_map, _ML_DATE_KEYS)
+        order_idx = _pick_index(header_map, _ML_ORDER_KEYS)
+        product_idx = _pick_index(header_map, _ML_PRODUCT_KEYS)
+        qty_idx = _pick_index(header_map, _ML_QTY_KEYS)
+        price_total_idx = _pick_index(header_map, _ML_PRICE_TOTAL_KEYS)
+        commission_idx = _pick_index(header_map, _ML_COMMISSION_KEYS)
+        tax_idx = _pick_index(header_map, _ML_TAX_KEYS)
+
+        required = [date_idx, product_idx, qty_idx, price_total_idx, commission_idx, tax_idx]
+        if any(idx is None for idx in required):
+            return [], "Faltan columnas obligatorias: Fecha, Producto, Cantidad, Precio Bruto Venta, Comision, Impuestos."
+
+        rows: list[dict] = []
+        for row in _data_rows(ws, len(headers)):
+            title = str(row[product_idx] or "").strip() if product_idx is not None else ""
+            if not title:
+                continue
+            qty = _parse_decimal(row[qty_idx])
+            if qty <= 0:
+                continue
+            price_total = _parse_decimal(row[price_total_idx])
+            commission = _parse_decimal(row[commission_idx])
+            taxes = _parse_decimal(row[tax_idx])
+            created_at = row[date_idx] if date_idx is not None else None
+            order_id = str(row[order_idx] or "").strip() if order_idx is not None else ""
+            rows.append(
+                {
+                    "title": title,
+                    "quantity": qty,
+                    "price_total": price_total,
+                    "commission": commission,
+                    "taxes": taxes,
+                    "created_at": created_at,
+                    "order_id": order_id,
+                }
+            )
+        return rows, None
+    finally:
+        wb.close()
 
 
 def _process_costs_xlsx(
@@ -345,6 +475,8 @@ def _process_costs_xlsx(
     group_override: str | None = None,
 ) -> tuple[int, int, int] | str:
     from ..models import Product
+    from ..signals import _bulk_audit
+    from .common import _invalidate_product_caches
 
     rows, error = _read_costs_xlsx_rows(upload)
     if error:
@@ -353,22 +485,37 @@ def _process_costs_xlsx(
     created = 0
     updated = 0
     skipped = 0
-    prefix_counters: dict[str, int] = {}
 
     effective_group = (group_override or "").strip()
-
+    if effective_group:
+        rows = [(effective_group, description, cost, sku) for _, description, cost, sku in rows]
+
+    # Los productos candidatos se traen de una vez (por SKU y por nombre) en
+    # lugar de hacer dos SELECT por fila.
+    skus = {sku.lower() for _, _, _, sku in rows if sku}
+    names = {description for _, description, _, _ in rows}
+    by_sku: dict[str, Product] = {}
+    by_name_group: dict[tuple[str, str], Product] = {}
+    if skus:
+        candidates = Product.objects.annotate(sku_lower=Lower("sku")).filter(sku_lower__in=skus).order_by("pk")
+        for product in candidates:
+            by_sku.setdefault(product.sku_lower, product)
+    for product in Product.objects.filter(name__in=names).order_by("pk"):
+        by_name_group.setdefault((product.name, product.group), product)
+
+    to_update: dict[int, Product] = {}
+    # Costo previo de cada producto existente, para el AuditLog.
+    old_costs: dict[int, Decimal] = {}
+    to_create: list[Product] = []
     for group, description, cost, sku in rows:
-        if effective_group:
-            group = effective_group
-
-        product = None
-        if sku:
-            product = Product.objects.filter(sku__iexact=sku).first()
+        product = by_sku.get(sku.lower()) if sku else None
         if not product:
-            product = Product.objects.filter(name=description, group=group).first()
+            product = by_name_group.get((description, group))
         if product:
+            if product.pk:
+                old_costs.setdefault(product.pk, product.avg_cost)
+                to_update[product.pk] = product
             product.avg_cost = cost
-            product.save(update_fields=["avg_cost"])
             updated += 1
             continue
 
@@ -376,28 +523,37 @@ def _process_costs_xlsx(
             skipped += 1
             continue
 
-        prefix = _sku_prefix(group, description)
-        if prefix not in prefix_counters:
-            existing = (
-                Product.objects.filter(sku__startswith=prefix)
-                .values_list("sku", flat=True)
-            )
-            max_suffix = 0
-            for sku in existing:
-                suffix = sku[len(prefix):]
-                if suffix.isdigit():
-                    max_suffix = max(max_suffix, int(suffix))
-            prefix_counters[prefix] = max_suffix
+        # El SKU se asigna después, cuando se conocen todos los prefijos nuevos.
+        product = Product(name=description, group=group, avg_cost=cost)
+        to_create.append(product)
+        by_name_group[(description, group)] = product
+        created += 1
 
+    # El mayor sufijo de cada prefijo lo calcula la base (MAX), sin traer los SKU.
+    prefix_counters = _max_sku_suffixes({_sku_prefix(product.group, product.name) for product in to_create})
+    for product in to_create:
+        prefix = _sku_prefix(product.group, product.name)
         prefix_counters[prefix] += 1
-        sku = f"{prefix}{prefix_counters[prefix]:04d}"
-
-        Product.objects.create(
-            sku=sku,
-            name=description,
-            group=group,
-            avg_cost=cost,
+        product.sku = f"{prefix}{prefix_counters[prefix]:04d}"
+
+    # Solo se escriben (y auditan) los costos que cambiaron.
+    changed = [product for pk, product in to_update.items() if product.avg_cost != old_costs[pk]]
+
+    # Todo el archivo en una sola transacción: o se aplica completo o nada.
+    # bulk_update/bulk_create no pasan por las señales de auditoría: el
+    # AuditLog se escribe acá, dentro de la misma transacción.
+    with transaction.atomic():
+        Product.objects.bulk_update(changed, ["avg_cost"], batch_size=500)
+        Product.objects.bulk_create(to_create, batch_size=500)
+        _bulk_audit(
+            Product,
+            created=to_create,
+            updated=[
+                (product, {"avg_cost": (old_costs[product.pk], product.avg_cost)}) for product in changed
+            ],
         )
-        created += 1
+    # bulk_update/bulk_create no disparan las señales de Product.
+    if changed or to_create:
+        _invalidate_product_caches()
 
     return created, updated, skipped